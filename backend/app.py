@@ -1,7 +1,9 @@
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
+import math
 import os
+import time
 from datetime import date
 import logging
 
@@ -10,13 +12,94 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Import module functions
-from facial_recognition import process_face_recognition
-from attendance_tracker import update_attendance, get_attendance_records, reset_session, get_current_session_id
-from posture_detector import analyze_posture
+from facial_recognition import (analyze_face_frame, list_students, student_exists, submit_enrollment,
+                                get_enrollment_job, remove_student, validate_student_name)
+from attendance_tracker import update_attendance_many, get_attendance_records, reset_session, get_current_session_id
+from posture_detector import analyze_posture_frame
+from frame_utils import decode_frame
+from frame_quality import assess_frame, low_quality_result
+from model_registry import registry
+from scheduler import scheduler
+from live_session import live_session, stream_events
+from metrics import render_prometheus, profiler, track_queue, REQUEST_LATENCY, REQUESTS
 
 app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
+# Load and warm up models in the background so the server starts answering
+# immediately; set PRELOAD_MODELS=0 to load them lazily on first use instead
+if os.environ.get('PRELOAD_MODELS', '1') != '0':
+    registry.start_background_loading()
+
+# Minimum seconds between live session updates pushed to each dashboard
+LIVE_UPDATE_INTERVAL = float(os.environ.get('LIVE_UPDATE_INTERVAL', '1.0'))
+live_session.reset(get_current_session_id())
+
+# Range a per-request deadline_ms is clamped to
+MIN_DEADLINE_MS = 50
+MAX_DEADLINE_MS = 30000
+
+@app.before_request
+def start_request_timer():
+    request.start_time = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or "unknown"
+    if hasattr(request, 'start_time'):
+        REQUEST_LATENCY.observe(time.perf_counter() - request.start_time, endpoint=endpoint)
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
+def analyze_frame(base64_image):
+    """Run the full analysis pipeline on one frame and record attendance"""
+    frame = decode_frame(base64_image)
+    
+    # Dark, blurred or overexposed frames skip the expensive stages and are
+    # not recorded, so they cannot skew attendance or engagement
+    quality = assess_frame(frame)
+    if not quality['ok']:
+        logger.info(f"Low quality frame: {quality}")
+        return low_quality_result(quality)
+    
+    # Process facial recognition and engagement
+    face_result = analyze_face_frame(frame)
+    logger.info(f"Face recognition result: {face_result}")
+    
+    # Process posture detection for every detected face
+    posture_result = analyze_posture_frame(frame, face_result['face_locations'], face_result['small_faces'])
+    logger.info(f"Posture detection result: {posture_result}")
+    
+    # Update attendance for every known face, each with its own engagement and posture
+    recognized = [
+        (name, engagement, posture)
+        for name, engagement, posture in zip(face_result['faces'], face_result['engagements'],
+                                             posture_result['postures'])
+        if name != "Unknown"
+    ]
+    if recognized:
+        update_attendance_many([
+            (name, engagement['engagement'], engagement['remarks'], posture['posture_status'])
+            for name, engagement, posture in recognized
+        ])
+        live_session.update([{
+            'name': name,
+            'engagement': engagement['engagement'],
+            'remarks': engagement['remarks'],
+            'gaze_status': engagement['gaze_status'],
+            'posture_status': posture['posture_status'],
+            'posture_score': posture['posture_score'],
+        } for name, engagement, posture in recognized])
+        logger.info(f"Updated attendance for {', '.join(name for name, _, _ in recognized)}")
+    
+    # Combine results
+    return {
+        **face_result,
+        **posture_result,
+        'frame_quality': "ok",
+        'quality': quality
+    }
+
 @app.route('/api/process-frame', methods=['POST'])
 def process_frame():
     try:
@@ -25,29 +108,25 @@ def process_frame():
         logger.info("Received frame processing request")
         base64_image = data['frame'].split(',')[1]
         
-        # Process facial recognition and engagement
-        face_result = process_face_recognition(base64_image)
-        logger.info(f"Face recognition result: {face_result}")
-        
-        # Process posture detection
-        posture_result = analyze_posture(base64_image)
-        logger.info(f"Posture detection result: {posture_result}")
+        # Frames are scheduled per client: only the newest pending frame of a
+        # client is analyzed, and frames that wait past their deadline are dropped
+        stream_id = data.get('client_id') or request.headers.get('X-Client-Id') or request.remote_addr
+        deadline = data.get('deadline_ms')
+        if deadline is not None:
+            try:
+                deadline = float(deadline)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'deadline_ms must be a number'}), 400
+            if not math.isfinite(deadline):
+                return jsonify({'error': 'deadline_ms must be a number'}), 400
+            deadline = min(max(deadline, MIN_DEADLINE_MS), MAX_DEADLINE_MS) / 1000
         
-        # Update attendance if a known face is detected
-        if face_result['faces'] and face_result['faces'][0] != "Unknown":
-            update_attendance(
-                face_result['faces'][0], 
-                face_result['engagement'], 
-                face_result['remarks'],
-                posture_result['posture_status']
-            )
-            logger.info(f"Updated attendance for {face_result['faces'][0]}")
+        with track_queue("process_frame"):
+            result, skip_reason = scheduler.run(stream_id, lambda: analyze_frame(base64_image), deadline)
         
-        # Combine results
-        result = {
-            **face_result,
-            **posture_result
-        }
+        if skip_reason is not None:
+            logger.info(f"Skipped frame from {stream_id}: {skip_reason}")
+            return jsonify({'skipped': True, 'reason': skip_reason})
         
         logger.info(f"Final response: {result}")
         return jsonify(result)
@@ -88,11 +167,31 @@ def get_attendance():
         logger.error(f"Error in get_attendance: {str(e)}")
         return jsonify({'error': str(e)}), 500
         
+@app.route('/api/live-session', methods=['GET'])
+def get_live_session():
+    """Current presence, engagement and posture of every student, from memory"""
+    return jsonify(live_session.snapshot())
+
+@app.route('/api/live-session/stream', methods=['GET'])
+def stream_live_session():
+    """Server-Sent Events: a snapshot followed by coalesced deltas"""
+    try:
+        interval = max(0.1, float(request.args.get('interval', LIVE_UPDATE_INTERVAL)))
+    except ValueError:
+        return jsonify({'error': 'interval must be a number'}), 400
+    logger.info(f"Live session subscriber connected (interval {interval}s)")
+    return Response(
+        stream_with_context(stream_events(live_session, interval)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/reset-session', methods=['POST'])
 def new_session():
     try:
         logger.info("Received request to start a new session")
         session_id = reset_session()
+        live_session.reset(session_id)
         return jsonify({'success': True, 'session_id': session_id})
     except Exception as e:
         logger.error(f"Error starting new session: {str(e)}")
@@ -107,10 +206,114 @@ def current_session():
         logger.error(f"Error getting current session: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/students', methods=['GET'])
+def get_students():
+    try:
+        return jsonify(list_students())
+    except Exception as e:
+        logger.error(f"Error listing students: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def enroll(name, data, must_exist):
+    """Validate an enrollment request and queue it; encoding happens in the background"""
+    if not data or not data.get('image'):
+        return jsonify({'error': 'image is required'}), 400
+    validate_student_name(name)
+    if student_exists(name) != must_exist:
+        if must_exist:
+            return jsonify({'error': f'Student {name} not found'}), 404
+        return jsonify({'error': f'Student {name} already exists'}), 409
+    image = data['image']
+    base64_image = image.split(',')[1] if ',' in image else image
+    job_id = submit_enrollment(name, base64_image)
+    logger.info(f"Queued enrollment job {job_id} for {name}")
+    return jsonify({'job_id': job_id, 'name': name, 'status': 'pending'}), 202
+
+@app.route('/api/students', methods=['POST'])
+def add_student():
+    try:
+        data = request.get_json(silent=True) or {}
+        return enroll(data.get('name'), data, must_exist=False)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error enrolling student: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/students/<name>', methods=['PUT'])
+def update_student(name):
+    try:
+        return enroll(name, request.get_json(silent=True), must_exist=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error updating student {name}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/students/<name>', methods=['DELETE'])
+def delete_student(name):
+    try:
+        if not remove_student(name):
+            return jsonify({'error': f'Student {name} not found'}), 404
+        return jsonify({'success': True, 'name': name})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error removing student {name}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/students/jobs/<job_id>', methods=['GET'])
+def enrollment_job(job_id):
+    job = get_enrollment_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics/profiler', methods=['GET', 'POST'])
+def sampling_profiler():
+    """Start/stop the sampling profiler (POST) or fetch collapsed stacks (GET)"""
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            action = data.get('action')
+            if action == 'start':
+                try:
+                    interval = float(data.get('interval', 0.01))
+                except (TypeError, ValueError):
+                    return jsonify({'error': 'interval must be a number'}), 400
+                if not math.isfinite(interval):
+                    return jsonify({'error': 'interval must be a number'}), 400
+                profiler.start(interval)
+                logger.info("Sampling profiler started")
+            elif action == 'stop':
+                profiler.stop()
+                logger.info("Sampling profiler stopped")
+            else:
+                return jsonify({'error': "action must be 'start' or 'stop'"}), 400
+            return jsonify(profiler.status())
+        return Response(profiler.collapsed(), mimetype='text/plain')
+    except Exception as e:
+        logger.error(f"Error in sampling_profiler: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/test', methods=['GET'])
 def test_route():
     return jsonify({"status": "Backend is running correctly"})
 
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once every model is loaded and warmed up, 503 before"""
+    is_ready = registry.is_ready()
+    if not is_ready:
+        # With PRELOAD_MODELS=0 nothing else would load the models, and a
+        # load that failed is retried; this is a no-op while one is running
+        registry.start_background_loading()
+    return jsonify({'ready': is_ready, 'models': registry.status()}), 200 if is_ready else 503
+
 if __name__ == '__main__':
     logger.info("Starting Flask server...")
     app.run(debug=True, port=5000, host='0.0.0.0')
@@ -3,12 +3,17 @@ from openpyxl import Workbook, load_workbook
 import os
 from datetime import date, datetime
 import shutil
+import threading
+from metrics import timed
 
 # Keep track of the current session
 CURRENT_SESSION_ID = datetime.now().strftime("%Y%m%d%H%M%S")
 ATTENDANCE_FILE = "attendance.xlsx"
 ARCHIVE_DIR = "attendance_archives"
 
+# Serializes read-modify-write cycles on the attendance file
+_file_lock = threading.Lock()
+
 def initialize_attendance_file():
     """Create a new attendance file with headers"""
     wb = Workbook()
@@ -27,38 +32,57 @@ def initialize_attendance_file():
 
 def update_attendance(name, engagement, remarks, posture_status):
     """Update the attendance Excel file with student data"""
-    try:
-        today = date.today().strftime("%Y-%m-%d")
-        
-        # Create file if it doesn't exist
-        if not os.path.exists(ATTENDANCE_FILE):
-            wb = initialize_attendance_file()
-        else:
-            try:
-                wb = load_workbook(ATTENDANCE_FILE)
-            except Exception as e:
-                print(f"Error loading existing attendance file: {e}")
-                # Backup the corrupted file if it exists
-                if os.path.exists(ATTENDANCE_FILE):
-                    corrupted_file = f"{ARCHIVE_DIR}/corrupted_{datetime.now().strftime('%Y%m%d%H%M%S')}.xlsx"
-                    try:
-                        shutil.copy(ATTENDANCE_FILE, corrupted_file)
-                        print(f"Backed up corrupted file to {corrupted_file}")
-                    except Exception as backup_error:
-                        print(f"Failed to backup corrupted file: {backup_error}")
-                # Create a new file
-                wb = initialize_attendance_file()
-        
-        sheet = wb.active
-        
-        # Append new data including session ID
-        sheet.append([today, CURRENT_SESSION_ID, name, "Present", engagement, remarks, posture_status])
-        wb.save(ATTENDANCE_FILE)
-        print(f"Updated attendance for {name} in session {CURRENT_SESSION_ID}")
+    return update_attendance_many([(name, engagement, remarks, posture_status)])
 
+@timed("attendance_write")
+def update_attendance_many(entries, session_id=None, record_date=None):
+    """Append several (name, engagement, remarks, posture_status) rows with a single load and save.
+
+    session_id and record_date default to the current session and today.
+    Returns False if the rows could not be written.
+    """
+    if not entries:
+        return True
+    try:
+        with _file_lock:
+            _append_rows(entries, session_id or CURRENT_SESSION_ID, record_date)
+        return True
     except Exception as e:
         print(f"Error updating attendance: {e}")
+        return False
+
+def _append_rows(entries, session_id, record_date):
+    """Load (or create) the attendance workbook, append the rows and save it"""
+    today = record_date or date.today().strftime("%Y-%m-%d")
+    # Create file if it doesn't exist
+    if not os.path.exists(ATTENDANCE_FILE):
+        wb = initialize_attendance_file()
+    else:
+        try:
+            wb = load_workbook(ATTENDANCE_FILE)
+        except Exception as e:
+            print(f"Error loading existing attendance file: {e}")
+            # Backup the corrupted file if it exists
+            if os.path.exists(ATTENDANCE_FILE):
+                corrupted_file = f"{ARCHIVE_DIR}/corrupted_{datetime.now().strftime('%Y%m%d%H%M%S')}.xlsx"
+                try:
+                    shutil.copy(ATTENDANCE_FILE, corrupted_file)
+                    print(f"Backed up corrupted file to {corrupted_file}")
+                except Exception as backup_error:
+                    print(f"Failed to backup corrupted file: {backup_error}")
+            # Create a new file
+            wb = initialize_attendance_file()
+    
+    sheet = wb.active
+    
+    # Append new data including session ID
+    for name, engagement, remarks, posture_status in entries:
+        sheet.append([today, session_id, name, "Present", engagement, remarks, posture_status])
+    wb.save(ATTENDANCE_FILE)
+    names = ", ".join(sorted({entry[0] for entry in entries}))
+    print(f"Updated attendance for {names} in session {session_id}")
 
+@timed("attendance_read")
 def get_attendance_records(session_id=None):
     """Get attendance records from the Excel file, optionally filtered by session"""
     if not os.path.exists(ATTENDANCE_FILE):
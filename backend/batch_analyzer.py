@@ -0,0 +1,212 @@
+"""
+Offline attendance and engagement analysis for recorded lectures.
+
+The video is sampled at a fixed rate and its timeline is split into chunks
+that are analyzed in parallel by worker processes. Each worker opens the
+video on its own, seeks to its chunk and builds its own gaze tracker and
+Pose graph. The results are written to the attendance file in one bulk
+write, either as one summary row per student (default) or as one row per
+sampled observation.
+
+Examples:
+    python batch_analyzer.py lecture.mp4
+    python batch_analyzer.py lecture.mp4 --sample-rate 2 --workers 8 --output timeline.json
+    python batch_analyzer.py lecture.mp4 --per-sample --session-id 20250101090000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+
+def probe_video(path):
+    """Return (fps, frame_count) of a video file"""
+    import cv2
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video {path}")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        capture.release()
+    if fps <= 0 or frame_count <= 0:
+        raise ValueError(f"Cannot read frame rate or length of {path}")
+    return fps, frame_count
+
+
+def plan_chunks(frame_count, step, chunk_frames):
+    """Split [0, frame_count) into chunks whose starts are multiples of the sampling step"""
+    chunk_frames = max(step, chunk_frames - chunk_frames % step)
+    return [(start, min(start + chunk_frames, frame_count)) for start in range(0, frame_count, chunk_frames)]
+
+
+def analyze_chunk(path, start, end, step, fps):
+    """Analyze every step-th frame in [start, end); runs inside a worker process"""
+    import cv2
+    from facial_recognition import analyze_face_frame
+    from frame_quality import assess_frame, record_skipped, GATED_STAGES
+    from posture_detector import analyze_posture_frame
+
+    # Parallelism comes from the worker processes; keep OpenCV from
+    # oversubscribing the cores with its own thread pool in each of them
+    cv2.setNumThreads(1)
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video {path}")
+    capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    observations = []
+    sampled = 0
+    low_quality = 0
+    try:
+        for index in range(start, end):
+            if (index - start) % step:
+                # grab() advances without converting the frame to BGR
+                if not capture.grab():
+                    break
+                continue
+            ok, frame = capture.read()
+            if not ok:
+                break
+            sampled += 1
+
+            if not assess_frame(frame)['ok']:
+                record_skipped(GATED_STAGES)
+                low_quality += 1
+                continue
+
+            face_result = analyze_face_frame(frame)
+            posture_result = analyze_posture_frame(frame, face_result['face_locations'], face_result['small_faces'])
+            for name, engagement, posture in zip(face_result['faces'], face_result['engagements'],
+                                                 posture_result['postures']):
+                if name == "Unknown":
+                    continue
+                observations.append({
+                    'timestamp': round(index / fps, 3),
+                    'name': name,
+                    'engagement': engagement['engagement'],
+                    'remarks': engagement['remarks'],
+                    'gaze_status': engagement['gaze_status'],
+                    'posture_status': posture['posture_status'],
+                    'posture_score': posture['posture_score'],
+                })
+    finally:
+        capture.release()
+    return {'start': start, 'end': end, 'sampled': sampled, 'low_quality': low_quality,
+            'observations': observations}
+
+
+def summarize_students(observations):
+    """One (name, engagement, remarks, posture_status) row per student for the whole video"""
+    by_name = defaultdict(list)
+    for observation in observations:
+        by_name[observation['name']].append(observation)
+
+    rows = []
+    for name in sorted(by_name):
+        seen = by_name[name]
+        engagement = round(sum(o['engagement'] for o in seen) / len(seen))
+        remarks = Counter(o['remarks'] for o in seen).most_common(1)[0][0]
+        posture = Counter(o['posture_status'] for o in seen).most_common(1)[0][0]
+        rows.append((name, engagement, remarks, posture))
+    return rows
+
+
+def run(args):
+    fps, frame_count = probe_video(args.video)
+    step = max(1, int(round(fps / args.sample_rate)))
+    chunks = plan_chunks(frame_count, step, int(args.chunk_seconds * fps))
+    duration = frame_count / fps
+    workers = min(args.workers, len(chunks))
+    print(f"{args.video}: {duration:.0f}s at {fps:.1f} fps, sampling every {step} frames, "
+          f"{len(chunks)} chunks on {workers} workers")
+
+    start_time = time.perf_counter()
+    results = []
+    failed = []
+    # Spawned workers start clean, so no model or native thread state is
+    # inherited from the parent and each builds its own models lazily
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {executor.submit(analyze_chunk, args.video, chunk_start, chunk_end, step, fps):
+                   (chunk_start, chunk_end) for chunk_start, chunk_end in chunks}
+        for done, future in enumerate(as_completed(futures), 1):
+            chunk_start, chunk_end = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # Keep the other chunks' results; the run still exits non-zero
+                failed.append({'start': chunk_start, 'end': chunk_end, 'error': str(e)})
+                print(f"  chunk {chunk_start / fps:.0f}-{chunk_end / fps:.0f}s failed: {e} "
+                      f"({done}/{len(chunks)})", file=sys.stderr)
+                continue
+            results.append(result)
+            print(f"  chunk {result['start'] / fps:.0f}-{result['end'] / fps:.0f}s: "
+                  f"{result['sampled']} frames ({result['low_quality']} low quality), "
+                  f"{len(result['observations'])} observations "
+                  f"({done}/{len(chunks)})")
+    elapsed = time.perf_counter() - start_time
+
+    observations = sorted((o for r in results for o in r['observations']), key=lambda o: o['timestamp'])
+    sampled = sum(r['sampled'] for r in results)
+    print(f"Analyzed {sampled} frames in {elapsed:.1f}s ({duration / elapsed:.1f}x real time), "
+          f"{len({o['name'] for o in observations})} students recognized")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'video': os.path.abspath(args.video), 'fps': fps, 'sample_step': step,
+                       'failed_chunks': failed, 'observations': observations}, f, indent=2)
+        print(f"Wrote timeline to {args.output}")
+
+    if not args.dry_run:
+        from attendance_tracker import update_attendance_many
+        if args.per_sample:
+            entries = [(o['name'], o['engagement'], o['remarks'], o['posture_status']) for o in observations]
+        else:
+            entries = summarize_students(observations)
+        if not update_attendance_many(entries, session_id=args.session_id, record_date=args.date):
+            print("Error: failed to write attendance rows", file=sys.stderr)
+            return 1
+        print(f"Wrote {len(entries)} attendance rows")
+
+    if failed:
+        print(f"Error: {len(failed)} of {len(chunks)} chunks failed, results are incomplete", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze attendance and engagement in a recorded lecture")
+    parser.add_argument('video', help="Path to the video file")
+    parser.add_argument('--sample-rate', type=float, default=1.0, help="Frames analyzed per second of video")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument('--chunk-seconds', type=float, default=120.0, help="Length of the timeline chunk given to a worker at a time")
+    parser.add_argument('--per-sample', action='store_true', help="Write one attendance row per observation instead of one per student")
+    parser.add_argument('--session-id', help="Session id for the attendance rows (default: a new id, the start time of this run)")
+    parser.add_argument('--date', help="Date for the attendance rows, YYYY-MM-DD (default: today)")
+    parser.add_argument('--output', help="Also write the full observation timeline as JSON")
+    parser.add_argument('--dry-run', action='store_true', help="Do not write to the attendance file")
+    args = parser.parse_args(argv)
+
+    if args.sample_rate <= 0 or args.workers < 1 or args.chunk_seconds <= 0:
+        parser.error("--sample-rate, --workers and --chunk-seconds must be positive")
+    if args.date is not None:
+        try:
+            datetime.strptime(args.date, "%Y-%m-%d")
+        except ValueError:
+            parser.error("--date must be a date in YYYY-MM-DD format")
+    try:
+        return run(args)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
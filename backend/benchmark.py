@@ -0,0 +1,324 @@
+"""
+Offline benchmark harness for the frame analysis pipeline.
+
+Replays a directory of recorded frames (or synthetic noise frames) through
+the individual pipeline stages and the full Flask endpoint, and reports
+throughput and latency percentiles per stage, plus the peak RSS of the
+whole run. Two result files can be compared to check a performance change
+before it is merged.
+
+Frames the endpoint skips or rejects as low quality are counted separately
+and left out of its latencies.
+
+Synthetic frames contain no faces, so face matching never runs on them and
+--gallery-size only affects results when replaying recorded --frames.
+
+Examples:
+    python benchmark.py run --frames recordings/ --gallery-size 500 --output base.json
+    python benchmark.py run --synthetic 50 --stages face,posture --output new.json
+    python benchmark.py compare base.json new.json
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+STAGES = ("face", "posture", "posture_per_face", "attendance", "endpoint")
+PERCENTILES = (50, 95, 99)
+# Frames the endpoint answered without running the full pipeline
+SKIP_OUTCOMES = ("skipped", "low_quality")
+FRAME_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def load_frames(frames_dir):
+    """Load recorded frames from a directory as base64 strings, sorted by file name"""
+    frames = []
+    for file in sorted(os.listdir(frames_dir)):
+        if file.lower().endswith(FRAME_EXTENSIONS):
+            with open(os.path.join(frames_dir, file), 'rb') as f:
+                frames.append(base64.b64encode(f.read()).decode('ascii'))
+    return frames
+
+
+def synthetic_frames(count, width=640, height=480, seed=0):
+    """Generate reproducible noise frames encoded as base64 JPEGs"""
+    import cv2
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        frame = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        ok, buffer = cv2.imencode('.jpg', frame)
+        if not ok:
+            raise RuntimeError("Failed to encode synthetic frame")
+        frames.append(base64.b64encode(buffer.tobytes()).decode('ascii'))
+    return frames
+
+
+def install_synthetic_gallery(size, seed=0):
+    """Pad the known face gallery with random 128-d encodings up to `size` entries"""
+    import facial_recognition  # noqa: F401 - registers the gallery model
+    from gallery import Gallery
+    from model_registry import registry
+    store = registry.get("gallery")
+    gallery = store.current()
+    rng = np.random.default_rng(seed)
+    missing = max(0, size - len(gallery))
+    # Real dlib encodings have a norm of roughly 0.5
+    encodings = np.vstack([gallery.encodings, rng.normal(0, 0.045, (missing, 128))])
+    names = list(gallery.names) + [f"synthetic_{i}" for i in range(missing)]
+    # Only swap the in-memory gallery; the shared cache file is left untouched
+    store.replace(Gallery(names, encodings, version=gallery.version + 1), persist=False)
+    return len(names)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in KiB on Linux
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def summarize(latencies, wall_time, outcomes=None):
+    """Summarize a list of per-call latencies (seconds) of fully processed frames.
+
+    outcomes counts the calls left out of the latencies, by SKIP_OUTCOMES reason.
+    """
+    values = np.asarray(latencies, dtype=np.float64)
+    outcomes = outcomes or {}
+    summary = {
+        'calls': int(values.size),
+        **{f'{outcome}_frames': outcomes.get(outcome, 0) for outcome in SKIP_OUTCOMES},
+        'wall_time_s': wall_time,
+        'throughput_fps': values.size / wall_time if wall_time > 0 else 0.0,
+        'mean_ms': float(values.mean() * 1000) if values.size else 0.0,
+        'max_ms': float(values.max() * 1000) if values.size else 0.0,
+    }
+    for p in PERCENTILES:
+        summary[f'p{p}_ms'] = float(np.percentile(values, p) * 1000) if values.size else 0.0
+    return summary
+
+
+def make_stage(stage):
+    """Return a callable taking one base64 frame for the given stage.
+
+    If the frame was answered without analysis the callable returns the
+    reason from SKIP_OUTCOMES; any other return value means it was processed.
+    """
+    if stage == "face":
+        from facial_recognition import process_face_recognition
+        return process_face_recognition
+    if stage == "posture":
+        from posture_detector import analyze_posture
+        return analyze_posture
+    if stage == "posture_per_face":
+        from facial_recognition import analyze_face_frame
+        from frame_utils import decode_frame
+        from posture_detector import analyze_posture_frame
+
+        def posture_per_face(frame):
+            frame = decode_frame(frame)
+            face_result = analyze_face_frame(frame)
+            analyze_posture_frame(frame, face_result['face_locations'], face_result['small_faces'])
+        return posture_per_face
+    if stage == "attendance":
+        from attendance_tracker import update_attendance
+        return lambda frame: update_attendance("benchmark_student", 100, "Actively participating", "Good Posture")
+    if stage == "endpoint":
+        from app import app
+        client = app.test_client()
+
+        def post_frame(frame):
+            response = client.post('/api/process-frame', json={'frame': 'data:image/jpeg;base64,' + frame})
+            if response.status_code != 200:
+                raise RuntimeError(f"/api/process-frame returned {response.status_code}: {response.get_data(as_text=True)}")
+            result = response.get_json()
+            if result.get('skipped'):
+                return "skipped"
+            if result.get('frame_quality') == "low":
+                return "low_quality"
+            return None
+        return post_frame
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def run_stage(func, frames, iterations, warmup):
+    """Replay frames through func and return a latency summary"""
+    for frame in frames[:warmup]:
+        func(frame)
+
+    latencies = []
+    outcomes = dict.fromkeys(SKIP_OUTCOMES, 0)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for frame in frames:
+            t0 = time.perf_counter()
+            outcome = func(frame)
+            elapsed = time.perf_counter() - t0
+            # Skipped and gated frames return early and would make the stage
+            # look faster than it is, so they are only counted
+            if isinstance(outcome, str) and outcome in outcomes:
+                outcomes[outcome] += 1
+            else:
+                latencies.append(elapsed)
+    wall_time = time.perf_counter() - start
+    return summarize(latencies, wall_time, outcomes)
+
+
+def run(args):
+    if args.frames:
+        frames = load_frames(args.frames)
+        source = os.path.abspath(args.frames)
+    else:
+        frames = synthetic_frames(args.synthetic, seed=args.seed)
+        source = f"synthetic:{args.synthetic}"
+        print("Warning: synthetic frames contain no faces, so face matching is not exercised "
+              "and --gallery-size has no effect; use --frames to measure gallery scaling", file=sys.stderr)
+    if not frames:
+        print("No frames to replay", file=sys.stderr)
+        return 1
+
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    for stage in stages:
+        if stage not in STAGES:
+            print(f"Unknown stage '{stage}', expected one of {', '.join(STAGES)}", file=sys.stderr)
+            return 1
+
+    # Keep attendance writes away from the real attendance file
+    workdir = tempfile.mkdtemp(prefix="attentive-bench-")
+    import attendance_tracker
+    attendance_tracker.ATTENDANCE_FILE = os.path.join(workdir, "attendance.xlsx")
+    attendance_tracker.ARCHIVE_DIR = os.path.join(workdir, "attendance_archives")
+
+    # Load and warm up every model first so start-up cost is reported separately
+    os.environ['PRELOAD_MODELS'] = '0'
+    import facial_recognition  # noqa: F401
+    import posture_detector  # noqa: F401
+    from model_registry import registry
+    load_start = time.perf_counter()
+    registry.load_all()
+    model_load_s = time.perf_counter() - load_start
+
+    gallery_size = install_synthetic_gallery(args.gallery_size, seed=args.seed)
+
+    report = {
+        'meta': {
+            'label': args.label,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'frames': len(frames),
+            'source': source,
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'gallery_size': gallery_size,
+            'model_load_s': model_load_s,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'stages': {},
+    }
+
+    for stage in stages:
+        func = make_stage(stage)
+        print(f"Benchmarking {stage} on {len(frames)} frames x {args.iterations} iterations...")
+        summary = run_stage(func, frames, args.iterations, args.warmup)
+        report['stages'][stage] = summary
+        print(f"  {summary['throughput_fps']:.2f} fps, p50 {summary['p50_ms']:.1f} ms, "
+              f"p95 {summary['p95_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms")
+        if summary['skipped_frames'] or summary['low_quality_frames']:
+            print(f"  excluded {summary['skipped_frames']} skipped and "
+                  f"{summary['low_quality_frames']} low quality frames from the latencies")
+
+    # ru_maxrss only ever grows, so it is reported once for the whole run
+    # rather than attributed to whichever stage happened to run last
+    report['meta']['peak_rss_mb'] = peak_rss_mb()
+    print(f"Peak RSS {report['meta']['peak_rss_mb']:.0f} MiB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote results to {args.output}")
+    return 0
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    metrics = ['throughput_fps'] + [f'p{p}_ms' for p in PERCENTILES]
+    # Shown for context only: a change here means the latencies cover a
+    # different set of frames, not that the pipeline got slower
+    counts = [f'{outcome}_frames' for outcome in SKIP_OUTCOMES]
+    rows = []
+    for stage, base in baseline['stages'].items():
+        cand = candidate['stages'].get(stage)
+        if cand is None:
+            rows.append((stage, None, None, None))
+            continue
+        rows.extend((stage, metric, base[metric], cand[metric]) for metric in metrics)
+        rows.extend((stage, metric, base.get(metric, 0), cand.get(metric, 0)) for metric in counts
+                    if base.get(metric) or cand.get(metric))
+    if 'peak_rss_mb' in baseline['meta'] and 'peak_rss_mb' in candidate['meta']:
+        rows.append(("run", 'peak_rss_mb', baseline['meta']['peak_rss_mb'], candidate['meta']['peak_rss_mb']))
+
+    regressions = 0
+    print(f"{'stage':<18}{'metric':<20}{'baseline':>12}{'candidate':>12}{'change':>10}")
+    for stage, metric, old, new in rows:
+        if metric is None:
+            print(f"{stage:<18}(missing from candidate)")
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        # Throughput should go up, everything else should go down
+        worse = -change if metric == 'throughput_fps' else change
+        flag = ""
+        if metric in counts:
+            if new != old:
+                flag = "  (different frames measured)"
+        elif worse > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{stage:<18}{metric:<20}{old:>12.2f}{new:>12.2f}{change:>9.1f}%{flag}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay benchmark for the attentive-owl backend")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Replay frames and record a benchmark run")
+    source = run_parser.add_mutually_exclusive_group()
+    source.add_argument('--frames', help="Directory of recorded JPEG/PNG frames")
+    source.add_argument('--synthetic', type=int, default=30, help="Number of synthetic frames when --frames is not given")
+    run_parser.add_argument('--gallery-size', type=int, default=100, help="Pad the known face gallery to this many encodings")
+    run_parser.add_argument('--stages', default=','.join(STAGES), help="Comma separated stages to run")
+    run_parser.add_argument('--iterations', type=int, default=1, help="Times to replay the frame set")
+    run_parser.add_argument('--warmup', type=int, default=3, help="Frames run before measuring each stage")
+    run_parser.add_argument('--seed', type=int, default=0, help="Seed for synthetic frames and gallery")
+    run_parser.add_argument('--label', default='', help="Free-form label stored with the results")
+    run_parser.add_argument('--output', help="Write results as JSON to this file")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser('compare', help="Compare two benchmark result files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=5.0, help="Percent change reported as a regression")
+    compare_parser.add_argument('--fail-on-regression', action='store_true', help="Exit non-zero if any regression is found")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
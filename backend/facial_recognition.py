@@ -1,92 +1,199 @@
 
-import face_recognition
 import cv2
-import numpy as np
 import os
-import base64
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from gaze_tracking import GazeTracking
+from frame_utils import decode_frame
+from frame_quality import face_large_enough, record_skipped
+from gallery import GalleryStore
+from metrics import timed, FRAMES_PROCESSED, FACES_DETECTED
+from model_registry import registry, synthetic_frame
 
-# Initialize gaze tracking
-gaze = GazeTracking()
+# Folder with one image per known student, named after the student
+data_folder = "data"
+IMAGE_EXTENSIONS = ('png', 'jpg', 'jpeg')
 
-# Initialize arrays for known face encodings and names
-known_face_encodings = []
-known_face_names = []
+# Encodings of the data folder images, shared by all worker processes
+gallery_path = os.path.join(data_folder, "gallery.npz")
 
-# Load face encodings from data folder
-data_folder = "data"
-if os.path.exists(data_folder):
-    for file in os.listdir(data_folder):
-        if file.lower().endswith(('png', 'jpg', 'jpeg')):
-            file_path = os.path.join(data_folder, file)
-            try:
-                image = face_recognition.load_image_file(file_path)
-                face_encodings = face_recognition.face_encodings(image)
-                if face_encodings:
-                    known_face_encodings.append(face_encodings[0])
-                    known_face_names.append(os.path.splitext(file)[0])
-            except Exception as e:
-                print(f"Error processing file {file}: {e}")
+# Set a threshold for recognition (adjust this based on testing)
+MATCH_THRESHOLD = 0.5
+
+# Student names double as image file names, so they must start and end with
+# a word character; matched with fullmatch, as $ also matches before a newline
+VALID_NAME = re.compile(r"\w(?:[\w .-]*\w)?")
+
+# The gaze tracker keeps per-frame state and dlib's encoder network is not
+# reentrant, so frames analyzed concurrently take turns on each of them
+_gaze_lock = threading.Lock()
+_encoder_lock = threading.Lock()
+
+def load_face_models():
+    """Import face_recognition, which loads dlib's detector, predictor and encoder"""
+    import face_recognition
+    return face_recognition
+
+def warm_up_face_models(face_recognition):
+    """Run detection and encoding once so the first real frame is not slowed down"""
+    frame = synthetic_frame()
+    face_recognition.face_locations(frame)
+    face_recognition.face_encodings(frame, [(100, 300, 300, 100)])
+
+def load_gaze_tracker():
+    """Build the gaze tracker, which loads the 68-point landmark predictor"""
+    return GazeTracking()
+
+def warm_up_gaze_tracker(gaze):
+    """Run the landmark predictor once on a fixed face box"""
+    gaze.refresh(synthetic_frame(), (100, 300, 300, 100))
+
+def encode_face_image(image):
+    """Return the encoding of the single face in an RGB image"""
+    face_recognition = registry.get("face_recognition")
+    with _encoder_lock:
+        face_encodings = face_recognition.face_encodings(image)
+    if not face_encodings:
+        raise ValueError("No face found in image")
+    if len(face_encodings) > 1:
+        raise ValueError("More than one face found in image")
+    return face_encodings[0]
+
+def student_images():
+    """Map each student name to (image path, modification time) in the data folder"""
+    images = {}
+    if os.path.exists(data_folder):
+        for file in os.listdir(data_folder):
+            if file.lower().endswith(IMAGE_EXTENSIONS):
+                file_path = os.path.join(data_folder, file)
+                images[os.path.splitext(file)[0]] = (file_path, os.path.getmtime(file_path))
+    return images
+
+def sync_with_data_folder(gallery):
+    """Encode new or changed images in the data folder and drop identities whose image is gone"""
+    face_recognition = registry.get("face_recognition")
+    images = student_images()
+    for name in gallery.names:
+        if name not in images:
+            gallery = gallery.without(name)
+    for name, (file_path, mtime) in images.items():
+        if name in gallery and gallery.mtimes[gallery.names.index(name)] == mtime:
+            continue
+        try:
+            image = face_recognition.load_image_file(file_path)
+            face_encodings = face_recognition.face_encodings(image)
+            if face_encodings:
+                gallery = gallery.with_identity(name, face_encodings[0], mtime)
+        except Exception as e:
+            print(f"Error processing file {file_path}: {e}")
+    return gallery
+
+def load_known_faces():
+    """Load the cached gallery, encoding only the student images that changed since"""
+    store = GalleryStore(gallery_path)
+    store.update(sync_with_data_folder)
+    print(f"Loaded {len(store.current())} known faces")
+    return store
+
+registry.register("face_recognition", load_face_models, warm_up_face_models)
+registry.register("gaze", load_gaze_tracker, warm_up_gaze_tracker)
+registry.register("gallery", load_known_faces)
 
 def process_face_recognition(base64_image):
     """Process a base64 image for face recognition and gaze tracking"""
-    # Decode base64 image
-    image_data = base64.b64decode(base64_image)
-    
-    # Convert to numpy array
-    nparr = np.frombuffer(image_data, np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    return analyze_face_frame(decode_frame(base64_image))
+
+def analyze_face_frame(frame):
+    """Run face recognition and gaze tracking on a BGR frame.
+
+    'face_locations' holds a (top, right, bottom, left) box and 'engagements'
+    the engagement, remarks and gaze status per entry in 'faces'. The
+    top-level engagement fields describe the first face. 'small_faces'
+    counts the detected faces left out for being too small.
+    """
+    face_recognition = registry.get("face_recognition")
+    gaze = registry.get("gaze")
+    # Take one snapshot so the whole frame is matched against the same gallery
+    gallery = registry.get("gallery").current()
+    FRAMES_PROCESSED.inc()
     
     # Convert BGR to RGB
     rgb_frame = frame[:, :, ::-1]
     
-    # Process gaze tracking
-    gaze.refresh(frame)
-    engagement_score = 100  # Default engagement score
-    engagement_remarks = "Actively participating"
+    # Find faces in the frame
+    with timed("face_detection"):
+        detected_locations = face_recognition.face_locations(rgb_frame)
     
-    # Determine engagement based on gaze
-    if gaze.is_blinking():
-        engagement_score -= 30
-        engagement_remarks = "Student appears to be sleeping"
-    elif gaze.is_right() or gaze.is_left():
-        engagement_score -= 20
-        engagement_remarks = "Student is distracted"
+    # Faces too small to encode reliably would only come out as "Unknown"
+    face_locations = [location for location in detected_locations if face_large_enough(location)]
+    small_faces = len(detected_locations) - len(face_locations)
+    if small_faces:
+        # Frames without any face skip these stages too, but that is not
+        # counted as a saving of the quality gate
+        record_skipped(("face_encoding", "gaze_tracking"), count=small_faces)
     
-    # Find faces in the frame
-    face_locations = face_recognition.face_locations(rgb_frame)
-    face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+    engagements = []
+    if face_locations:
+        # Track the eyes of every face from its own box, so each student is
+        # scored on their own gaze; frames used for pupil threshold
+        # calibration are much more expensive, so they are timed separately
+        with _gaze_lock:
+            for location in face_locations:
+                gaze_stage = "gaze_tracking" if gaze.calibration.is_complete() else "gaze_calibration"
+                with timed(gaze_stage):
+                    gaze.refresh(frame, location)
+                engagements.append(engagement_from_gaze(gaze))
+    
+    with _encoder_lock, timed("face_encoding"):
+        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+    
+    # Match all faces against the gallery at once
+    with timed("face_matching"):
+        matches = gallery.match(face_encodings, MATCH_THRESHOLD)
     
     face_names = []
     
-    for face_encoding in face_encodings:
-        matches = face_recognition.compare_faces(known_face_encodings, face_encoding)
-        face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-        
-        name = "Unknown"
-        
-        # Set a threshold for recognition (adjust this based on testing)
-        threshold = 0.5
-        
-        if len(face_distances) > 0:  # Ensure there are face distances to compare
-            best_match_index = np.argmin(face_distances)
-            min_distance = face_distances[best_match_index]
-            
-            if matches[best_match_index] and min_distance < threshold:  # Only accept if confidence is high
-                name = known_face_names[best_match_index]
-        
+    for name, min_distance in matches:
         face_names.append(name)
-        print(f"Face detected: {name} with confidence: {1 - min_distance if len(face_distances) > 0 else 'N/A'}")
+        FACES_DETECTED.inc(result="unknown" if name == "Unknown" else "recognized")
+        print(f"Face detected: {name} with confidence: {1 - min_distance if min_distance is not None else 'N/A'}")
     
     # Determine if the frame contains any activity (faces)
-    activity_status = "Active" if face_locations else "Inactive"
+    activity_status = "Active" if detected_locations else "Inactive"
     
     return {
         'faces': face_names,
+        **(engagements[0] if engagements else DEFAULT_ENGAGEMENT),
+        'engagements': engagements,
+        'activity_status': activity_status,
+        'face_locations': [list(location) for location in face_locations],
+        'small_faces': small_faces
+    }
+
+# Engagement reported when no face could be analyzed
+DEFAULT_ENGAGEMENT = {
+    'engagement': 100,
+    'remarks': "Actively participating",
+    'gaze_status': "unknown",
+}
+
+def engagement_from_gaze(gaze):
+    """Engagement score, remarks and gaze status of the face last analyzed by the tracker"""
+    engagement_score = 100
+    engagement_remarks = "Actively participating"
+    if gaze.is_blinking():
+        engagement_score -= 30
+        engagement_remarks = "Student appears to be sleeping"
+    elif gaze.is_right() or gaze.is_left():
+        engagement_score -= 20
+        engagement_remarks = "Student is distracted"
+    return {
         'engagement': engagement_score,
         'remarks': engagement_remarks,
         'gaze_status': get_gaze_status(gaze),
-        'activity_status': activity_status
     }
 
 def get_gaze_status(gaze):
@@ -101,3 +208,83 @@ def get_gaze_status(gaze):
         return "looking_center"
     else:
         return "unknown"
+
+# Enrollment jobs run on a single background thread, off the request path
+_enrollment_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="enrollment")
+_enrollment_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+MAX_TRACKED_JOBS = 100
+
+def validate_student_name(name):
+    """Raise ValueError unless the name is safe to use as an image file name"""
+    if not isinstance(name, str) or not VALID_NAME.fullmatch(name) or len(name) > 100:
+        raise ValueError("Invalid student name")
+
+def list_students():
+    """Return the names in the current gallery and its version"""
+    gallery = registry.get("gallery").current()
+    return {'students': sorted(gallery.names), 'version': gallery.version}
+
+def student_exists(name):
+    return name in registry.get("gallery").current()
+
+def submit_enrollment(name, base64_image):
+    """Queue encoding of a student image; returns a job id to poll with get_enrollment_job"""
+    validate_student_name(name)
+    job_id = uuid.uuid4().hex
+    with _jobs_lock:
+        _enrollment_jobs[job_id] = {'job_id': job_id, 'name': name, 'status': 'pending', 'error': None}
+        while len(_enrollment_jobs) > MAX_TRACKED_JOBS:
+            _enrollment_jobs.popitem(last=False)
+    _enrollment_executor.submit(_run_enrollment, job_id, name, base64_image)
+    return job_id
+
+def get_enrollment_job(job_id):
+    with _jobs_lock:
+        job = _enrollment_jobs.get(job_id)
+        return dict(job) if job else None
+
+def _set_job(job_id, **fields):
+    with _jobs_lock:
+        if job_id in _enrollment_jobs:
+            _enrollment_jobs[job_id].update(fields)
+
+def _run_enrollment(job_id, name, base64_image):
+    """Encode the image, store it in the data folder and publish the new gallery"""
+    _set_job(job_id, status='running')
+    try:
+        frame = decode_frame(base64_image)
+        if frame is None:
+            raise ValueError("Could not decode image")
+        encoding = encode_face_image(frame[:, :, ::-1])
+        
+        os.makedirs(data_folder, exist_ok=True)
+        _remove_student_images(name)
+        file_path = os.path.join(data_folder, f"{name}.jpg")
+        cv2.imwrite(file_path, frame)
+        mtime = os.path.getmtime(file_path)
+        
+        gallery = registry.get("gallery").update(lambda g: g.with_identity(name, encoding, mtime))
+        _set_job(job_id, status='done', version=gallery.version)
+        print(f"Enrolled {name}, gallery version {gallery.version}")
+    except Exception as e:
+        print(f"Error enrolling {name}: {e}")
+        _set_job(job_id, status='failed', error=str(e))
+
+def _remove_student_images(name):
+    for extension in IMAGE_EXTENSIONS:
+        for candidate in (extension, extension.upper()):
+            file_path = os.path.join(data_folder, f"{name}.{candidate}")
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+def remove_student(name):
+    """Remove a student from the gallery and the data folder; returns False if unknown"""
+    validate_student_name(name)
+    store = registry.get("gallery")
+    if name not in store.current():
+        return False
+    _remove_student_images(name)
+    gallery = store.update(lambda g: g.without(name) if name in g else g)
+    print(f"Removed {name}, gallery version {gallery.version}")
+    return True
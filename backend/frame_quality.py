@@ -0,0 +1,117 @@
+import os
+import cv2
+import numpy as np
+from metrics import Counter, STAGE_LATENCY, timed
+
+# Thresholds, configurable through the environment
+MIN_BRIGHTNESS = float(os.environ.get('QUALITY_MIN_BRIGHTNESS', '40'))     # mean gray level
+MAX_BRIGHTNESS = float(os.environ.get('QUALITY_MAX_BRIGHTNESS', '220'))    # mean gray level
+MAX_CLIPPED_FRACTION = float(os.environ.get('QUALITY_MAX_CLIPPED', '0.5'))  # share of crushed or blown-out pixels
+MIN_SHARPNESS = float(os.environ.get('QUALITY_MIN_SHARPNESS', '50'))       # variance of the Laplacian
+MIN_FACE_SIZE = int(os.environ.get('QUALITY_MIN_FACE_SIZE', '40'))         # face box height in pixels
+
+# Frames are assessed on a downscaled grayscale copy to keep the check cheap
+ANALYSIS_WIDTH = 320
+
+# Gray levels counted as crushed shadows / blown highlights
+DARK_LEVEL = 16
+BRIGHT_LEVEL = 240
+
+FRAMES_GATED = Counter(
+    "attentive_quality_rejected_frames_total",
+    "Frames rejected by the quality gate before analysis, by reason",
+    labels=("reason",))
+STAGES_SKIPPED = Counter(
+    "attentive_quality_skipped_stages_total",
+    "Pipeline stage runs skipped because of the quality gate",
+    labels=("stage",))
+SECONDS_SAVED = Counter(
+    "attentive_quality_saved_seconds_total",
+    "Estimated compute time saved by skipped stages, from their recent median latency")
+
+
+def assess_frame(frame):
+    """Score brightness, exposure and sharpness of a BGR frame.
+
+    Returns:
+        dict with 'ok', the 'reason' for rejecting the frame (None if ok)
+        and the measured values
+    """
+    with timed("quality_check"):
+        height, width = frame.shape[:2]
+        if width > ANALYSIS_WIDTH:
+            scale = ANALYSIS_WIDTH / width
+            frame = cv2.resize(frame, (ANALYSIS_WIDTH, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        histogram = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+        pixels = histogram.sum()
+        brightness = float(np.dot(histogram, np.arange(256)) / pixels)
+        dark_fraction = float(histogram[:DARK_LEVEL].sum() / pixels)
+        bright_fraction = float(histogram[BRIGHT_LEVEL:].sum() / pixels)
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+    reason = None
+    if brightness < MIN_BRIGHTNESS or dark_fraction > MAX_CLIPPED_FRACTION:
+        reason = "too_dark"
+    elif brightness > MAX_BRIGHTNESS or bright_fraction > MAX_CLIPPED_FRACTION:
+        reason = "overexposed"
+    elif sharpness < MIN_SHARPNESS:
+        reason = "blurred"
+
+    if reason is not None:
+        FRAMES_GATED.inc(reason=reason)
+
+    return {
+        'ok': reason is None,
+        'reason': reason,
+        'brightness': round(brightness, 1),
+        'dark_fraction': round(dark_fraction, 3),
+        'bright_fraction': round(bright_fraction, 3),
+        'sharpness': round(sharpness, 1),
+    }
+
+
+def face_large_enough(face_location):
+    """True if a (top, right, bottom, left) face box is big enough to encode reliably"""
+    top, right, bottom, left = face_location
+    return bottom - top >= MIN_FACE_SIZE
+
+
+def record_skipped(stages, count=1):
+    """Count skipped stage runs and the compute time they would have taken"""
+    saved = 0.0
+    for stage in stages:
+        STAGES_SKIPPED.inc(count, stage=stage)
+        median = STAGE_LATENCY.quantiles(stage=stage).get(0.5)
+        if median is not None:
+            saved += median * count
+    if saved:
+        SECONDS_SAVED.inc(saved)
+
+
+# Stages that a rejected frame never reaches
+GATED_STAGES = ("gaze_tracking", "face_detection", "face_encoding", "face_matching", "pose")
+
+
+def low_quality_result(quality):
+    """Response for a frame rejected by the quality gate, shaped like a normal result"""
+    record_skipped(GATED_STAGES)
+    return {
+        'faces': [],
+        'face_locations': [],
+        'small_faces': 0,
+        'engagement': None,
+        'engagements': [],
+        'remarks': f"Frame quality too low ({quality['reason'].replace('_', ' ')})",
+        'gaze_status': "unknown",
+        'posture_status': "Not detected",
+        'neck_angle': 0,
+        'left_bend': 0,
+        'right_bend': 0,
+        'posture_score': 0,
+        'postures': [],
+        'activity_status': "Unknown",
+        'frame_quality': "low",
+        'quality': quality,
+    }
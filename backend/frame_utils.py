@@ -0,0 +1,12 @@
+import base64
+import cv2
+import numpy as np
+from metrics import timed
+
+
+def decode_frame(base64_image):
+    """Decode a base64 encoded JPEG/PNG into a BGR numpy array"""
+    with timed("decode"):
+        image_data = base64.b64decode(base64_image)
+        nparr = np.frombuffer(image_data, np.uint8)
+        return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
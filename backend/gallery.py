@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from metrics import GALLERY_SIZE
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+ENCODING_SIZE = 128
+
+
+def _file_stamp(path):
+    """Identify a version of a file by (inode, mtime).
+
+    Every publish goes through os.replace, which brings in a new inode, so
+    a change is noticed even if both writes fall in one mtime tick.
+    """
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns
+
+
+class Gallery(object):
+    """
+    Immutable snapshot of the known faces. Encodings are stored in a single
+    read-only, C-contiguous array so matching is one matrix product. Changes
+    build a new Gallery, which is then swapped in as a whole, so a match in
+    progress always sees a consistent set of names and encodings.
+    """
+
+    def __init__(self, names=(), encodings=None, mtimes=None, version=0):
+        self.names = tuple(names)
+        if encodings is None:
+            encodings = np.empty((0, ENCODING_SIZE))
+        encodings = np.array(encodings, dtype=np.float64, order='C').reshape(-1, ENCODING_SIZE)
+        if len(encodings) != len(self.names):
+            raise ValueError("Gallery needs exactly one encoding per name")
+        encodings.setflags(write=False)
+        self.encodings = encodings
+        self._squared_norms = np.einsum('ij,ij->i', encodings, encodings)
+        # Modification time of the source image of each identity, used to
+        # tell which images in the data folder need to be encoded again
+        self.mtimes = tuple(mtimes) if mtimes is not None else (0.0,) * len(self.names)
+        self.version = version
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def distances(self, face_encodings):
+        """Euclidean distances between each face (rows) and each known face (columns)"""
+        face_encodings = np.asarray(face_encodings, dtype=np.float64).reshape(-1, ENCODING_SIZE)
+        squared = (np.einsum('ij,ij->i', face_encodings, face_encodings)[:, np.newaxis]
+                   + self._squared_norms[np.newaxis, :]
+                   - 2 * face_encodings @ self.encodings.T)
+        return np.sqrt(np.maximum(squared, 0))
+
+    def match(self, face_encodings, threshold):
+        """Return a (name, distance) pair per face; name is "Unknown" above the threshold"""
+        if len(face_encodings) == 0:
+            return []
+        if len(self) == 0:
+            return [("Unknown", None)] * len(face_encodings)
+        distances = self.distances(face_encodings)
+        best = np.argmin(distances, axis=1)
+        results = []
+        for row, index in enumerate(best):
+            distance = float(distances[row, index])
+            name = self.names[index] if distance < threshold else "Unknown"
+            results.append((name, distance))
+        return results
+
+    def with_identity(self, name, encoding, mtime=0.0):
+        """Return a new gallery with the identity added or its encoding replaced"""
+        names = list(self.names)
+        encodings = list(self.encodings)
+        mtimes = list(self.mtimes)
+        if name in self._index:
+            i = self._index[name]
+            encodings[i] = encoding
+            mtimes[i] = mtime
+        else:
+            names.append(name)
+            encodings.append(encoding)
+            mtimes.append(mtime)
+        return Gallery(names, encodings, mtimes, self.version + 1)
+
+    def without(self, name):
+        """Return a new gallery without the identity"""
+        keep = [i for i, n in enumerate(self.names) if n != name]
+        return Gallery([self.names[i] for i in keep], self.encodings[keep],
+                       [self.mtimes[i] for i in keep], self.version + 1)
+
+
+class GalleryStore(object):
+    """
+    Holds the current Gallery and keeps it in sync with a cache file shared
+    by all worker processes. Publishing writes the cache atomically and
+    swaps the in-memory reference; other processes notice the new file on
+    their next lookup and reload it.
+    """
+
+    def __init__(self, path, sync_interval=1.0):
+        self.path = path
+        self.sync_interval = sync_interval
+        self._gallery = Gallery()
+        self._loaded_stamp = None
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Return the current gallery, picking up changes made by other processes"""
+        now = time.monotonic()
+        if now - self._last_sync >= self.sync_interval:
+            self._last_sync = now
+            try:
+                stamp = _file_stamp(self.path)
+            except OSError:
+                stamp = None
+            if stamp is not None and stamp != self._loaded_stamp:
+                with self._lock:
+                    self._reload()
+        return self._gallery
+
+    def _reload(self):
+        try:
+            stamp = _file_stamp(self.path)
+            with np.load(self.path, allow_pickle=False) as data:
+                gallery = Gallery([str(n) for n in data['names']], data['encodings'],
+                                  data['mtimes'], int(data['version']))
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Error reading gallery cache {self.path}: {e}")
+            return
+        if gallery.version != self._gallery.version or stamp != self._loaded_stamp:
+            self._set(gallery)
+        self._loaded_stamp = stamp
+
+    def _set(self, gallery):
+        # Rebinding a single attribute is atomic, so readers never block
+        self._gallery = gallery
+        GALLERY_SIZE.set(len(gallery))
+
+    def _write(self, gallery):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, names=np.array(gallery.names, dtype=str).reshape(-1),
+                 encodings=gallery.encodings, mtimes=np.array(gallery.mtimes, dtype=np.float64),
+                 version=gallery.version)
+        os.replace(tmp_path, self.path)
+        self._loaded_stamp = _file_stamp(self.path)
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialize read-modify-write cycles across threads and processes"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path + ".lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def update(self, change):
+        """Apply change(gallery) -> gallery to the latest gallery and publish the result"""
+        with self._file_lock():
+            if os.path.exists(self.path):
+                self._reload()
+            gallery = change(self._gallery)
+            if gallery is not self._gallery:
+                self._write(gallery)
+                self._set(gallery)
+            return gallery
+
+    def replace(self, gallery, persist=True):
+        """Publish a complete gallery, optionally without writing the cache file"""
+        if persist:
+            with self._file_lock():
+                self._write(gallery)
+                self._set(gallery)
+        else:
+            self._set(gallery)
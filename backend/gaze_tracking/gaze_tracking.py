@@ -16,6 +16,7 @@ class GazeTracking(object):
 
     def __init__(self):
         self.frame = None
+        self._gray = None
         self.eye_left = None
         self.eye_right = None
         self.calibration = Calibration()
@@ -40,10 +41,14 @@ class GazeTracking(object):
         except Exception:
             return False
 
-    def _analyze(self):
-        """Detects the face and initialize Eye objects"""
-        frame = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
-        faces = self._face_detector(frame)
+    def _analyze(self, face=None):
+        """Detects the face (unless one is given) and initialize Eye objects"""
+        frame = self._gray
+        if face is not None:
+            top, right, bottom, left = face
+            faces = [dlib.rectangle(int(left), int(top), int(right), int(bottom))]
+        else:
+            faces = self._face_detector(frame)
 
         try:
             landmarks = self._predictor(frame, faces[0])
@@ -54,14 +59,19 @@ class GazeTracking(object):
             self.eye_left = None
             self.eye_right = None
 
-    def refresh(self, frame):
+    def refresh(self, frame, face=None):
         """Refreshes the frame and analyzes it.
 
         Arguments:
             frame (numpy.ndarray): The frame to analyze
+            face (tuple): Optional (top, right, bottom, left) box of the face
+                to analyze; without it the first face found by the detector is used
         """
+        # Several faces of the same frame share one grayscale conversion
+        if frame is not self.frame or self._gray is None:
+            self._gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         self.frame = frame
-        self._analyze()
+        self._analyze(face)
 
     def pupil_left_coords(self):
         """Returns the coordinates of the left pupil"""
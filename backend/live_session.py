@@ -0,0 +1,160 @@
+import json
+import threading
+import time
+from datetime import date
+
+from metrics import Gauge
+
+LIVE_SUBSCRIBERS = Gauge(
+    "attentive_live_subscribers",
+    "Dashboards currently subscribed to live session updates")
+
+# Students not seen for this many seconds are shown as absent
+PRESENCE_TIMEOUT = 30.0
+
+
+class LiveSession(object):
+    """
+    In-memory view of the current class: the latest presence, engagement
+    and posture of every student, updated as frames are processed. Every
+    change bumps a version number so subscribers can ask for everything
+    that changed since the version they last saw.
+    """
+
+    def __init__(self, session_id=None):
+        self._cond = threading.Condition()
+        self.session_id = session_id
+        self.version = 0
+        self._reset_version = 0
+        self._students = {}
+        self._changed_at = {}
+
+    def _touch(self, name):
+        self._changed_at[name] = self.version
+
+    def update(self, observations):
+        """Record the latest state of the students seen in one frame.
+
+        Arguments:
+            observations (list): dicts with name, engagement, remarks,
+                gaze_status, posture_status and posture_score
+        """
+        if not observations:
+            return
+        now = time.time()
+        today = date.today().strftime("%Y-%m-%d")
+        with self._cond:
+            self.version += 1
+            for observation in observations:
+                name = observation['name']
+                self._students[name] = {
+                    'date': today,
+                    'session': self.session_id,
+                    'name': name,
+                    'status': "Present",
+                    'engagement': observation['engagement'],
+                    'remarks': observation['remarks'],
+                    'gaze_status': observation.get('gaze_status'),
+                    'posture': observation['posture_status'],
+                    'posture_score': observation.get('posture_score'),
+                    'last_seen': now,
+                }
+                self._touch(name)
+            self._cond.notify_all()
+
+    def reset(self, session_id):
+        """Start a new session with no students"""
+        with self._cond:
+            self.version += 1
+            self._reset_version = self.version
+            self.session_id = session_id
+            self._students = {}
+            self._changed_at = {}
+            self._cond.notify_all()
+
+    def _expire(self):
+        # Called with the condition held; marks students who left as absent
+        cutoff = time.time() - PRESENCE_TIMEOUT
+        stale = [name for name, student in self._students.items()
+                 if student['status'] == "Present" and student['last_seen'] < cutoff]
+        if stale:
+            self.version += 1
+            for name in stale:
+                self._students[name] = dict(self._students[name], status="Absent")
+                self._touch(name)
+
+    def snapshot(self):
+        """Return the full state of the session"""
+        with self._cond:
+            self._expire()
+            return {
+                'session_id': self.session_id,
+                'version': self.version,
+                'students': [dict(student) for student in self._students.values()],
+            }
+
+    def changes_since(self, version):
+        """Return the students changed after the given version.
+
+        If the session was reset since then, the whole state is returned
+        with 'reset' set, and the subscriber should replace what it has.
+        """
+        with self._cond:
+            self._expire()
+            if version < self._reset_version:
+                students = list(self._students.values())
+                reset = True
+            else:
+                students = [self._students[name] for name, changed in self._changed_at.items()
+                            if changed > version]
+                reset = False
+            return {
+                'session_id': self.session_id,
+                'version': self.version,
+                'reset': reset,
+                'students': [dict(student) for student in students],
+            }
+
+    def wait_for_change(self, version, timeout):
+        """Block until the session moves past the given version; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._expire()
+                if self.version > version:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                # Wake up periodically so absent students are noticed
+                self._cond.wait(min(remaining, PRESENCE_TIMEOUT / 2))
+
+
+def stream_events(session, interval, keepalive=15.0):
+    """Yield Server-Sent Events: a snapshot, then deltas at most once per interval"""
+    LIVE_SUBSCRIBERS.inc()
+    try:
+        snapshot = session.snapshot()
+        version = snapshot['version']
+        yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+        last_sent = time.monotonic()
+
+        while True:
+            if not session.wait_for_change(version, keepalive):
+                # Comment lines keep proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+
+            # Coalesce everything that changes until the next send slot
+            wait = interval - (time.monotonic() - last_sent)
+            if wait > 0:
+                time.sleep(wait)
+            delta = session.changes_since(version)
+            version = delta['version']
+            last_sent = time.monotonic()
+            yield f"event: delta\ndata: {json.dumps(delta)}\n\n"
+    finally:
+        LIVE_SUBSCRIBERS.dec()
+
+
+live_session = LiveSession()
@@ -0,0 +1,322 @@
+import math
+import sys
+import threading
+import time
+from collections import Counter as _StackCounter
+from contextlib import contextmanager
+
+# Histogram bucket boundaries (seconds) used for all latency metrics
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Range the sampling profiler interval is clamped to: the lower bound keeps
+# its GIL usage small, the upper one keeps the sampling thread responsive
+MIN_PROFILER_INTERVAL = 0.005
+MAX_PROFILER_INTERVAL = 1.0
+
+# Number of recent observations kept per series for the p50/p95/p99 estimates
+QUANTILE_WINDOW = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+
+_registry = []
+
+
+def _format_labels(label_names, label_values, extra=None):
+    """Render a Prometheus label set such as {stage="decode"}"""
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.extend(extra)
+    if not pairs:
+        return ""
+    rendered = ",".join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return "{" + rendered + "}"
+
+
+class _Metric(object):
+    """Base class for a metric family with an optional fixed set of labels"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, value in series:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, e.g. queue depth or gallery size"""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class _HistogramSeries(object):
+    """Bucket counts plus a ring buffer of recent samples for quantiles"""
+
+    __slots__ = ("buckets", "count", "total", "window", "position")
+
+    def __init__(self, n_buckets):
+        self.buckets = [0] * n_buckets
+        self.count = 0
+        self.total = 0.0
+        self.window = []
+        self.position = 0
+
+
+class Histogram(_Metric):
+    """Latency histogram exposing Prometheus buckets and recent p50/p95/p99"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.bucket_bounds = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.bucket_bounds))
+            for i, bound in enumerate(self.bucket_bounds):
+                if value <= bound:
+                    series.buckets[i] += 1
+                    break
+            series.count += 1
+            series.total += value
+            if len(series.window) < QUANTILE_WINDOW:
+                series.window.append(value)
+            else:
+                series.window[series.position] = value
+                series.position = (series.position + 1) % QUANTILE_WINDOW
+
+    def quantiles(self, **labels):
+        """Return {quantile: value} over the most recent observations"""
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            window = list(series.window) if series else []
+        return _window_quantiles(window)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        quantile_lines = []
+        with self._lock:
+            snapshot = [(key, list(s.buckets), s.count, s.total, list(s.window))
+                        for key, s in sorted(self._series.items())]
+        for key, buckets, count, total, window in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.bucket_bounds, buckets):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, [("le", repr(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            plain = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{plain} {total}")
+            lines.append(f"{self.name}_count{plain} {count}")
+            for q, value in _window_quantiles(window).items():
+                labels = _format_labels(self.label_names, key, [("quantile", str(q))])
+                quantile_lines.append(f"{self.name}_recent{labels} {value}")
+        if quantile_lines:
+            lines.append(f"# HELP {self.name}_recent Quantiles over the last {QUANTILE_WINDOW} observations")
+            lines.append(f"# TYPE {self.name}_recent gauge")
+            lines.extend(quantile_lines)
+        return lines
+
+
+def _window_quantiles(window):
+    """Nearest-rank quantiles of a list of samples"""
+    if not window:
+        return {}
+    ordered = sorted(window)
+    last = len(ordered) - 1
+    return {q: ordered[min(last, int(round(q * last)))] for q in QUANTILES}
+
+
+# Pipeline metrics shared by all backend modules
+STAGE_LATENCY = Histogram(
+    "attentive_stage_duration_seconds",
+    "Time spent in each stage of the frame analysis pipeline",
+    labels=("stage",))
+STAGE_ERRORS = Counter(
+    "attentive_stage_errors_total",
+    "Exceptions raised inside a pipeline stage",
+    labels=("stage",))
+REQUEST_LATENCY = Histogram(
+    "attentive_request_duration_seconds",
+    "End-to-end latency of API requests",
+    labels=("endpoint",))
+REQUESTS = Counter(
+    "attentive_requests_total",
+    "API requests handled, by endpoint and HTTP status",
+    labels=("endpoint", "status"))
+FRAMES_PROCESSED = Counter(
+    "attentive_frames_processed_total",
+    "Frames that went through the analysis pipeline")
+FACES_DETECTED = Counter(
+    "attentive_faces_detected_total",
+    "Faces found by the detector, split into recognized and unknown",
+    labels=("result",))
+QUEUE_DEPTH = Gauge(
+    "attentive_queue_depth",
+    "Work items currently waiting or running, by queue",
+    labels=("queue",))
+GALLERY_SIZE = Gauge(
+    "attentive_gallery_size",
+    "Number of known face encodings loaded for matching")
+
+
+@contextmanager
+def timed(stage):
+    """Time a block of code and record it under the given pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+
+
+@contextmanager
+def track_queue(queue):
+    """Count a work item in the given queue for as long as the block runs"""
+    QUEUE_DEPTH.inc(queue=queue)
+    try:
+        yield
+    finally:
+        QUEUE_DEPTH.dec(queue=queue)
+
+
+def render_prometheus():
+    """Render every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler(object):
+    """
+    Statistical profiler that periodically samples the Python stacks of all
+    threads. Stacks are aggregated in the collapsed format understood by
+    flamegraph.pl and speedscope, so it can be switched on in production
+    for a short while without restarting the server.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.interval = 0.01
+        self.samples = _StackCounter()
+        self.started_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=0.01):
+        """Start sampling every `interval` seconds, clearing previous samples"""
+        with self._lock:
+            if self.running:
+                return False
+            interval = float(interval)
+            if not math.isfinite(interval):
+                raise ValueError("Profiler interval must be a finite number")
+            self.interval = min(max(interval, MIN_PROFILER_INTERVAL), MAX_PROFILER_INTERVAL)
+            self.samples = _StackCounter()
+            self.started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """Stop sampling; collected samples are kept until the next start"""
+        with self._lock:
+            if not self.running:
+                return False
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            return True
+
+    def _run(self):
+        own_id = threading.get_ident()
+        file_names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                # Walk the frames directly; traceback.extract_stack would also
+                # look up source lines, which costs several times more per sample
+                entries = []
+                while frame is not None:
+                    code = frame.f_code
+                    file_name = file_names.get(code.co_filename)
+                    if file_name is None:
+                        file_name = file_names[code.co_filename] = code.co_filename.rsplit('/', 1)[-1]
+                    entries.append(f"{code.co_name} ({file_name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                entries.reverse()
+                self.samples[";".join(entries)] += 1
+
+    def collapsed(self):
+        """Return samples as 'frame;frame;frame count' lines, hottest first"""
+        samples = self.samples.copy()
+        return "\n".join(f"{stack} {count}" for stack, count in samples.most_common()) + "\n"
+
+    def status(self):
+        return {
+            'running': self.running,
+            'interval': self.interval,
+            'started_at': self.started_at,
+            'samples': sum(self.samples.values()),
+        }
+
+
+profiler = SamplingProfiler()
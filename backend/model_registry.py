@@ -0,0 +1,129 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from metrics import Gauge
+
+MODEL_LOAD_SECONDS = Gauge(
+    "attentive_model_load_seconds",
+    "Time taken to load and warm up each model",
+    labels=("model",))
+MODEL_READY = Gauge(
+    "attentive_model_ready",
+    "1 once a model is loaded and warmed up, 0 otherwise",
+    labels=("model",))
+
+
+def synthetic_frame(width=640, height=480):
+    """Build a deterministic BGR frame used to warm up the models"""
+    gradient = np.linspace(0, 255, width, dtype=np.uint8)
+    frame = np.repeat(gradient[np.newaxis, :], height, axis=0)
+    return np.ascontiguousarray(np.stack([frame, frame[::-1], frame], axis=-1))
+
+
+class ModelRegistry(object):
+    """
+    Keeps track of the heavy models used by the pipeline so that none of
+    them are built as a side effect of importing a module. Models are
+    loaded on first use, or ahead of time in background threads, and run
+    a warm-up inference before they are reported as ready.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._background = None
+
+    def register(self, name, loader, warmup=None):
+        """Register a model by name.
+
+        Arguments:
+            name (str): Key used to fetch the model with get()
+            loader (callable): Builds and returns the model
+            warmup (callable): Optional, receives the model and runs one inference
+        """
+        with self._lock:
+            self._entries[name] = {
+                'loader': loader,
+                'warmup': warmup,
+                'model': None,
+                'state': 'pending',
+                'error': None,
+                'load_seconds': None,
+                'lock': threading.Lock(),
+            }
+        MODEL_READY.set(0, model=name)
+
+    def get(self, name):
+        """Return the model, loading and warming it up first if needed"""
+        entry = self._entries[name]
+        if entry['state'] == 'ready':
+            return entry['model']
+        with entry['lock']:
+            # Another thread may have finished loading while we waited
+            if entry['state'] != 'ready':
+                self._load(name, entry)
+            return entry['model']
+
+    def _load(self, name, entry):
+        entry['state'] = 'loading'
+        start = time.perf_counter()
+        try:
+            model = entry['loader']()
+            if entry['warmup'] is not None:
+                entry['warmup'](model)
+        except Exception as e:
+            entry['state'] = 'failed'
+            entry['error'] = str(e)
+            print(f"Error loading model {name}: {e}")
+            raise
+        entry['model'] = model
+        entry['error'] = None
+        entry['load_seconds'] = time.perf_counter() - start
+        entry['state'] = 'ready'
+        MODEL_LOAD_SECONDS.set(entry['load_seconds'], model=name)
+        MODEL_READY.set(1, model=name)
+        print(f"Model {name} ready in {entry['load_seconds']:.2f}s")
+
+    def load_all(self):
+        """Load and warm up every registered model in parallel, blocking until done"""
+        names = list(self._entries)
+        if not names:
+            return
+        with ThreadPoolExecutor(max_workers=len(names), thread_name_prefix="model-loader") as executor:
+            for future in [executor.submit(self._try_get, name) for name in names]:
+                future.result()
+
+    def _try_get(self, name):
+        try:
+            self.get(name)
+        except Exception:
+            # The failure is recorded in the entry and reported by status()
+            pass
+
+    def start_background_loading(self):
+        """Start loading all models in a background thread without blocking"""
+        with self._lock:
+            if self._background is None or not self._background.is_alive():
+                self._background = threading.Thread(target=self.load_all, name="model-preload", daemon=True)
+                self._background.start()
+
+    def is_ready(self):
+        """True once every registered model is loaded and warmed up"""
+        return all(entry['state'] == 'ready' for entry in self._entries.values())
+
+    def status(self):
+        """Return the load state of every model"""
+        return {
+            name: {
+                'state': entry['state'],
+                'load_seconds': entry['load_seconds'],
+                'error': entry['error'],
+            }
+            for name, entry in self._entries.items()
+        }
+
+
+registry = ModelRegistry()
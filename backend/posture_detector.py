@@ -1,105 +1,203 @@
 
+import threading
 import cv2
 import mediapipe as mp
 import numpy as np
-import base64
+from frame_utils import decode_frame
+from frame_quality import record_skipped
+from metrics import timed
+from model_registry import registry, synthetic_frame
 
-# Initialize MediaPipe Pose
 mp_pose = mp.solutions.pose
-pose = mp_pose.Pose(static_image_mode=True, min_detection_confidence=0.5)
+
+def load_pose_model():
+    """Build the MediaPipe Pose graph"""
+    return mp_pose.Pose(static_image_mode=True, min_detection_confidence=0.5)
+
+def warm_up_pose_model(pose):
+    """Run one inference so graph initialization happens before real traffic"""
+    pose.process(cv2.cvtColor(synthetic_frame(), cv2.COLOR_BGR2RGB))
+
+registry.register("pose", load_pose_model, warm_up_pose_model)
+
+# Landmarks used for the posture angles, in the order they are stored per person
+POSTURE_LANDMARKS = (
+    mp_pose.PoseLandmark.LEFT_SHOULDER,
+    mp_pose.PoseLandmark.RIGHT_SHOULDER,
+    mp_pose.PoseLandmark.LEFT_EAR,
+    mp_pose.PoseLandmark.RIGHT_EAR,
+    mp_pose.PoseLandmark.NOSE,
+)
+
+# Upper-body region derived from a face box, in multiples of the face size
+ROI_SIDE_MARGIN = 1.5
+ROI_TOP_MARGIN = 0.5
+ROI_BOTTOM_MARGIN = 2.5
+
+# The Pose graph processes one image at a time
+_pose_lock = threading.Lock()
+
+# Crops are downscaled so their longest side is at most this many pixels,
+# which keeps the Pose cost per person independent of the camera resolution
+ROI_MAX_SIDE = 256
 
 def calculate_angle(a, b, c):
-    """Calculate the angle between three points"""
-    a = np.array(a)  # First point
-    b = np.array(b)  # Mid point
-    c = np.array(c)  # End point
+    """Calculate the angle at b formed by points a and c.
+
+    Points can be single (x, y) pairs or arrays of shape (N, 2), in which
+    case the angles for all N triples are computed at once.
+    """
+    a = np.asarray(a, dtype=np.float64)  # First point(s)
+    b = np.asarray(b, dtype=np.float64)  # Mid point(s)
+    c = np.asarray(c, dtype=np.float64)  # End point(s)
     
     ba = a - b
     bc = c - b
     
-    # Handle potential division by zero
-    norm_ba = np.linalg.norm(ba)
-    norm_bc = np.linalg.norm(bc)
+    norm_product = np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1)
     
-    if norm_ba == 0 or norm_bc == 0:
-        return 0
-    
-    cosine_angle = np.dot(ba, bc) / (norm_ba * norm_bc)
+    # Handle potential division by zero; those angles are reported as 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosine_angle = np.einsum('...i,...i->...', ba, bc) / norm_product
     # Ensure the value is within valid arccos range [-1, 1]
     cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
-    angle = np.degrees(np.arccos(cosine_angle))
+    angle = np.where(norm_product == 0, 0.0, np.degrees(np.arccos(cosine_angle)))
     
-    return angle
+    return float(angle) if angle.ndim == 0 else angle
 
-def analyze_posture(base64_image):
-    """Analyze posture from a base64 encoded image"""
-    # Decode base64 image
-    image_data = base64.b64decode(base64_image)
+def upper_body_rois(face_locations, frame_shape):
+    """Derive an upper-body box (x0, y0, x1, y1) from each (top, right, bottom, left) face box"""
+    height, width = frame_shape[:2]
+    rois = []
+    for top, right, bottom, left in face_locations:
+        face_width = right - left
+        face_height = bottom - top
+        x0 = max(0, int(left - ROI_SIDE_MARGIN * face_width))
+        x1 = min(width, int(right + ROI_SIDE_MARGIN * face_width))
+        y0 = max(0, int(top - ROI_TOP_MARGIN * face_height))
+        y1 = min(height, int(bottom + ROI_BOTTOM_MARGIN * face_height))
+        rois.append((x0, y0, x1, y1))
+    return rois
+
+def detect_keypoints(pose, rgb_image):
+    """Run Pose on one image.
+
+    Returns:
+        (keypoints, activity_status) where keypoints is a (5, 2) array of
+        normalized coordinates ordered as POSTURE_LANDMARKS, or None
+    """
+    with _pose_lock, timed("pose"):
+        results = pose.process(rgb_image)
+    
+    if not results.pose_landmarks:
+        # No landmarks detected, user is inactive
+        return None, "Inactive"
+    
+    landmarks = results.pose_landmarks.landmark
+    try:
+        keypoints = np.array([[landmarks[point].x, landmarks[point].y] for point in POSTURE_LANDMARKS])
+    except (IndexError, AttributeError) as e:
+        print(f"Error analyzing posture landmarks: {e}")
+        return None, "Partially Active"  # Some landmarks detected but not all
+    return keypoints, "Active"
+
+def score_postures(keypoints):
+    """Compute angles and posture scores for an (N, 5, 2) keypoint array at once"""
+    left_shoulder, right_shoulder, left_ear, right_ear, nose = np.moveaxis(keypoints, 1, 0)
     
-    # Convert to numpy array
-    nparr = np.frombuffer(image_data, np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    neck_angle = calculate_angle(left_shoulder, nose, right_shoulder)
+    left_bend = calculate_angle(left_ear, left_shoulder, nose)
+    right_bend = calculate_angle(right_ear, right_shoulder, nose)
+    
+    # Determine Posture - using exact same criteria as original code
+    good = (50 < neck_angle) & (neck_angle < 90) & (left_bend < 40) & (right_bend < 40)
+    # Calculate a score based on deviation from ideal angles, capped at a minimum of 20
+    angle_deviation = np.abs(70 - neck_angle) + np.abs(20 - left_bend) + np.abs(20 - right_bend)
+    posture_score = np.where(good, 100, np.maximum(20, 100 - angle_deviation))
+    
+    return good, neck_angle, left_bend, right_bend, posture_score
+
+def not_detected_posture(activity_status):
+    """Posture entry for a person whose keypoints were not found; score 0 indicates inactivity"""
+    return {
+        'posture_status': "Not detected",
+        'neck_angle': 0,
+        'left_bend': 0,
+        'right_bend': 0,
+        'posture_score': 0,
+        'activity_status': activity_status
+    }
+
+def analyze_posture_frame(frame, face_locations=None, small_faces=0):
+    """Analyze posture in a BGR frame.
+
+    With face_locations, posture is computed for every person from an
+    upper-body crop around their face; otherwise the whole frame is
+    treated as a single person. The top-level fields describe the first
+    person and 'postures' holds one entry per face, in the same order.
+
+    small_faces is the number of detected faces that were too small to
+    analyze. They get no posture, and if no other face is left Pose is not
+    run at all instead of falling back to the whole frame.
+    """
+    if small_faces:
+        record_skipped(("pose",), count=small_faces)
+        if not face_locations:
+            return {**not_detected_posture("Active"), 'postures': []}
     
     # Convert to RGB for MediaPipe
     rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    pose = registry.get("pose")
     
-    # Default values
-    posture_status = "Not detected"
-    neck_angle = 0
-    left_bend = 0
-    right_bend = 0
-    posture_score = 0  # Default score is now 0 to indicate inactivity
-    activity_status = "Inactive"  # Added activity status
-    
-    # Process frame with MediaPipe Pose
-    results = pose.process(rgb_frame)
-    
-    if results.pose_landmarks:
-        landmarks = results.pose_landmarks.landmark
-        activity_status = "Active"  # If landmarks detected, user is active
-
-        # Get necessary key points
-        try:
-            left_shoulder = [landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER].x, landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER].y]
-            right_shoulder = [landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER].x, landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER].y]
-            left_ear = [landmarks[mp_pose.PoseLandmark.LEFT_EAR].x, landmarks[mp_pose.PoseLandmark.LEFT_EAR].y]
-            right_ear = [landmarks[mp_pose.PoseLandmark.RIGHT_EAR].x, landmarks[mp_pose.PoseLandmark.RIGHT_EAR].y]
-            nose = [landmarks[mp_pose.PoseLandmark.NOSE].x, landmarks[mp_pose.PoseLandmark.NOSE].y]
-            
-            # Calculate angles for posture analysis
-            neck_angle = calculate_angle(left_shoulder, nose, right_shoulder)
-            left_bend = calculate_angle(left_ear, left_shoulder, nose)
-            right_bend = calculate_angle(right_ear, right_shoulder, nose)
-
-            # Determine Posture - using exact same criteria as original code
-            if 50 < neck_angle < 90 and left_bend < 40 and right_bend < 40:
-                posture_status = "Good Posture"
-                posture_score = 100
-            else:
-                posture_status = "Bad Posture"
-                # Calculate a score based on deviation from ideal angles
-                angle_deviation = abs(70 - neck_angle) + abs(20 - left_bend) + abs(20 - right_bend)
-                posture_score = max(0, 100 - angle_deviation)
-                
-                # If the score is too low, cap it at a minimum
-                posture_score = max(20, posture_score)
-        
-        except (IndexError, AttributeError) as e:
-            print(f"Error analyzing posture landmarks: {e}")
-            activity_status = "Partially Active"  # Some landmarks detected but not all
+    detections = []
+    if face_locations:
+        height, width = frame.shape[:2]
+        for x0, y0, x1, y1 in upper_body_rois(face_locations, frame.shape):
+            crop = rgb_frame[y0:y1, x0:x1]
+            if crop.size == 0:
+                detections.append((None, "Inactive"))
+                continue
+            scale = ROI_MAX_SIDE / max(crop.shape[:2])
+            if scale < 1:
+                crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            keypoints, activity_status = detect_keypoints(pose, crop)
+            if keypoints is not None:
+                # Map back to whole-frame normalized coordinates so the angle
+                # thresholds mean the same as for a full-frame analysis
+                keypoints = (keypoints * [x1 - x0, y1 - y0] + [x0, y0]) / [width, height]
+            detections.append((keypoints, activity_status))
     else:
-        # No landmarks detected, user is inactive
-        activity_status = "Inactive"
+        detections.append(detect_keypoints(pose, rgb_frame))
+    
+    postures = [not_detected_posture(activity_status) for _, activity_status in detections]
+    
+    detected = [i for i, (keypoints, _) in enumerate(detections) if keypoints is not None]
+    if detected:
+        good, neck_angle, left_bend, right_bend, posture_score = score_postures(
+            np.stack([detections[i][0] for i in detected]))
+        for j, i in enumerate(detected):
+            postures[i].update({
+                'posture_status': "Good Posture" if good[j] else "Bad Posture",
+                'neck_angle': round(float(neck_angle[j]), 1),
+                'left_bend': round(float(left_bend[j]), 1),
+                'right_bend': round(float(right_bend[j]), 1),
+                'posture_score': int(round(posture_score[j])),
+            })
     
-    print(f"Posture Analysis - Status: {posture_status}, Neck Angle: {neck_angle}, " 
-          f"Left Bend: {left_bend}, Right Bend: {right_bend}, " 
-          f"Score: {posture_score}, Activity: {activity_status}")
+    for posture in postures:
+        print(f"Posture Analysis - Status: {posture['posture_status']}, Neck Angle: {posture['neck_angle']}, " 
+              f"Left Bend: {posture['left_bend']}, Right Bend: {posture['right_bend']}, " 
+              f"Score: {posture['posture_score']}, Activity: {posture['activity_status']}")
+    
+    # The frame counts as active if anyone in it was detected
+    activity_status = "Active" if detected else postures[0]['activity_status']
     
     return {
-        'posture_status': posture_status,
-        'neck_angle': round(neck_angle, 1),
-        'left_bend': round(left_bend, 1),
-        'right_bend': round(right_bend, 1),
-        'posture_score': round(posture_score),
-        'activity_status': activity_status
+        **postures[0],
+        'activity_status': activity_status,
+        'postures': postures
     }
+
+def analyze_posture(base64_image, face_locations=None):
+    """Analyze posture from a base64 encoded image"""
+    return analyze_posture_frame(decode_frame(base64_image), face_locations)
@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import Counter, QUEUE_DEPTH, STAGE_LATENCY
+
+FRAMES_SKIPPED = Counter(
+    "attentive_frames_skipped_total",
+    "Frames dropped by the scheduler without being analyzed, by reason",
+    labels=("reason",))
+
+# Reasons reported in a skipped response
+SUPERSEDED = "superseded"  # a newer frame from the same client arrived first
+DEADLINE = "deadline"      # the frame waited longer than its deadline
+OVERLOADED = "overloaded"  # too many clients are waiting already
+
+
+class _Job(object):
+    """A frame waiting for, or going through, analysis"""
+
+    __slots__ = ("stream_id", "func", "deadline", "submitted_at", "done", "result", "error", "skip_reason")
+
+    def __init__(self, stream_id, func, deadline):
+        self.stream_id = stream_id
+        self.func = func
+        self.deadline = deadline
+        self.submitted_at = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.skip_reason = None
+
+    def skip(self, reason):
+        self.skip_reason = reason
+        FRAMES_SKIPPED.inc(reason=reason)
+        self.done.set()
+
+
+class FrameScheduler(object):
+    """
+    Admission control in front of the analysis pipeline.
+
+    Each client stream has a single pending slot: a new frame replaces the
+    one still waiting, so only the newest frame is ever analyzed. Streams
+    are served in arrival order by a fixed number of worker threads, which
+    bounds how many frames are analyzed at once. Frames that are still
+    waiting when their deadline passes are dropped rather than analyzed late.
+    """
+
+    def __init__(self, max_concurrency=1, max_pending_streams=64, default_deadline=2.0):
+        self.max_concurrency = max_concurrency
+        self.max_pending_streams = max_pending_streams
+        self.default_deadline = default_deadline
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()
+        self._running = 0
+        self._workers = []
+
+    def _ensure_workers(self):
+        # Called with the condition held; workers are started on first use so
+        # that importing the module does not spawn threads
+        if self._workers:
+            return
+        for i in range(self.max_concurrency):
+            worker = threading.Thread(target=self._work, name=f"frame-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def run(self, stream_id, func, deadline=None):
+        """Schedule func() for a stream and wait for it.
+
+        Arguments:
+            stream_id (str): Identifies the client; at most one frame per stream waits
+            func (callable): The analysis to run, called without arguments
+            deadline (float): Seconds the frame may wait before being dropped
+
+        Returns:
+            (result, skip_reason) where skip_reason is None if func() ran.
+            Exceptions raised by func() are re-raised in the caller.
+        """
+        if deadline is None:
+            deadline = self.default_deadline
+        job = _Job(stream_id, func, time.monotonic() + deadline)
+
+        with self._cond:
+            self._ensure_workers()
+            previous = self._pending.get(stream_id)
+            if previous is not None:
+                # Keep the stream's place in line but swap in the newer frame
+                previous.skip(SUPERSEDED)
+            elif len(self._pending) >= self.max_pending_streams:
+                job.skip(OVERLOADED)
+                return None, job.skip_reason
+            self._pending[stream_id] = job
+            self._update_depth()
+            self._cond.notify()
+
+        if not job.done.wait(deadline):
+            # Drop the frame if no worker has picked it up yet; if it is
+            # already running, wait for the result instead
+            with self._cond:
+                if self._pending.get(stream_id) is job:
+                    del self._pending[stream_id]
+                    self._update_depth()
+                    job.skip(DEADLINE)
+            job.done.wait()
+
+        if job.error is not None:
+            raise job.error
+        return job.result, job.skip_reason
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                _, job = self._pending.popitem(last=False)
+                self._running += 1
+                self._update_depth()
+
+            try:
+                if time.monotonic() > job.deadline:
+                    job.skip(DEADLINE)
+                    continue
+                STAGE_LATENCY.observe(time.monotonic() - job.submitted_at, stage="queue_wait")
+                try:
+                    job.result = job.func()
+                except Exception as e:
+                    job.error = e
+                job.done.set()
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._update_depth()
+
+    def _update_depth(self):
+        QUEUE_DEPTH.set(len(self._pending), queue="scheduler_pending")
+        QUEUE_DEPTH.set(self._running, queue="scheduler_running")
+
+
+scheduler = FrameScheduler(
+    max_concurrency=int(os.environ.get('FRAME_CONCURRENCY', '1')),
+    max_pending_streams=int(os.environ.get('FRAME_MAX_PENDING_STREAMS', '64')),
+    default_deadline=float(os.environ.get('FRAME_DEADLINE_MS', '2000')) / 1000,
+)
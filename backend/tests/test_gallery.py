@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pytest
+
+from gallery import Gallery, GalleryStore, ENCODING_SIZE
+
+
+def encoding(value):
+    vector = np.zeros(ENCODING_SIZE)
+    vector[0] = value
+    return vector
+
+
+def test_with_identity_adds_and_replaces():
+    gallery = Gallery().with_identity("alice", encoding(0.0), mtime=1.0)
+    gallery = gallery.with_identity("bob", encoding(1.0), mtime=2.0)
+    assert gallery.names == ("alice", "bob")
+    assert gallery.version == 2
+
+    updated = gallery.with_identity("alice", encoding(3.0), mtime=5.0)
+    assert updated.names == ("alice", "bob")
+    assert updated.encodings[0, 0] == 3.0
+    assert updated.mtimes == (5.0, 2.0)
+    assert updated.version == 3
+    # The original snapshot is left untouched
+    assert gallery.encodings[0, 0] == 0.0
+    assert not gallery.encodings.flags.writeable
+
+
+def test_without_removes_identity():
+    gallery = Gallery(["alice", "bob"], [encoding(0.0), encoding(1.0)], [1.0, 2.0])
+    smaller = gallery.without("alice")
+    assert smaller.names == ("bob",)
+    assert smaller.mtimes == (2.0,)
+    assert smaller.encodings[0, 0] == 1.0
+    assert "alice" not in smaller and "alice" in gallery
+    assert len(gallery.without("nobody")) == 2
+
+
+def test_match_uses_threshold():
+    gallery = Gallery(["alice", "bob"], [encoding(0.0), encoding(1.0)])
+    matches = gallery.match([encoding(0.1), encoding(0.9), encoding(5.0)], threshold=0.5)
+    assert [name for name, _ in matches] == ["alice", "bob", "Unknown"]
+    assert matches[0][1] == pytest.approx(0.1)
+    assert matches[2][1] == pytest.approx(4.0)
+
+
+def test_match_empty_inputs():
+    assert Gallery().match([encoding(0.0)], threshold=0.5) == [("Unknown", None)]
+    assert Gallery(["alice"], [encoding(0.0)]).match([], threshold=0.5) == []
+
+
+def test_encoding_count_must_match_names():
+    with pytest.raises(ValueError):
+        Gallery(["alice", "bob"], [encoding(0.0)])
+
+
+def test_store_reloads_when_file_changes(tmp_path):
+    path = str(tmp_path / "gallery.npz")
+    writer = GalleryStore(path)
+    reader = GalleryStore(path, sync_interval=0)
+    assert len(reader.current()) == 0
+
+    writer.update(lambda g: g.with_identity("alice", encoding(0.0)))
+    assert reader.current().names == ("alice",)
+
+    writer.update(lambda g: g.with_identity("bob", encoding(1.0)))
+    gallery = reader.current()
+    assert gallery.names == ("alice", "bob")
+    assert gallery.version == 2
+    # Unchanged file: the same snapshot is returned without reloading
+    assert reader.current() is gallery
+
+
+def test_store_reloads_replaced_file_with_same_mtime(tmp_path):
+    # Filesystems with coarse timestamps can give two writes the same mtime
+    path = str(tmp_path / "gallery.npz")
+    writer = GalleryStore(path)
+    reader = GalleryStore(path, sync_interval=0)
+    writer.update(lambda g: g.with_identity("alice", encoding(0.0)))
+    first = os.stat(path)
+    assert reader.current().names == ("alice",)
+
+    writer.update(lambda g: g.with_identity("bob", encoding(1.0)))
+    os.utime(path, ns=(first.st_atime_ns, first.st_mtime_ns))
+    assert reader.current().names == ("alice", "bob")
+
+
+def test_store_update_starts_from_latest_file(tmp_path):
+    path = str(tmp_path / "gallery.npz")
+    first = GalleryStore(path)
+    second = GalleryStore(path)
+    first.update(lambda g: g.with_identity("alice", encoding(0.0)))
+    second.update(lambda g: g.with_identity("bob", encoding(1.0)))
+    assert second.current().names == ("alice", "bob")
+
+
+def test_replace_without_persist_leaves_file_alone(tmp_path):
+    path = tmp_path / "gallery.npz"
+    store = GalleryStore(str(path))
+    store.replace(Gallery(["alice"], [encoding(0.0)], version=1), persist=False)
+    assert store.current().names == ("alice",)
+    assert not path.exists()
@@ -0,0 +1,104 @@
+import json
+import time
+
+import live_session as live_session_module
+from live_session import LiveSession, stream_events
+
+
+def observation(name, engagement=100, posture="Good Posture"):
+    return {
+        'name': name,
+        'engagement': engagement,
+        'remarks': "Actively participating",
+        'gaze_status': "looking_center",
+        'posture_status': posture,
+        'posture_score': 100,
+    }
+
+
+def names(update):
+    return sorted(student['name'] for student in update['students'])
+
+
+def test_delta_contains_only_changed_students():
+    session = LiveSession("s1")
+    session.update([observation("alice"), observation("bob")])
+    seen = session.version
+
+    session.update([observation("bob", engagement=70)])
+    delta = session.changes_since(seen)
+    assert delta['reset'] is False
+    assert delta['version'] == seen + 1
+    assert names(delta) == ["bob"]
+    assert delta['students'][0]['engagement'] == 70
+
+    assert session.changes_since(delta['version'])['students'] == []
+
+
+def test_update_without_observations_keeps_version():
+    session = LiveSession("s1")
+    session.update([])
+    assert session.version == 0
+
+
+def test_subscriber_behind_reset_gets_full_state():
+    session = LiveSession("s1")
+    session.update([observation("alice")])
+    behind = session.version
+
+    session.reset("s2")
+    session.update([observation("carol"), observation("dave")])
+    session.update([observation("dave", engagement=50)])
+
+    delta = session.changes_since(behind)
+    assert delta['reset'] is True
+    assert delta['session_id'] == "s2"
+    assert names(delta) == ["carol", "dave"]
+
+    snapshot = session.snapshot()
+    assert snapshot['session_id'] == "s2"
+    assert names(snapshot) == ["carol", "dave"]
+
+
+def test_students_past_timeout_become_absent(monkeypatch):
+    monkeypatch.setattr(live_session_module, "PRESENCE_TIMEOUT", 0.05)
+    session = LiveSession("s1")
+    session.update([observation("alice")])
+    seen = session.version
+
+    time.sleep(0.1)
+    session.update([observation("bob")])
+    snapshot = session.snapshot()
+    status = {student['name']: student['status'] for student in snapshot['students']}
+    assert status == {"alice": "Absent", "bob": "Present"}
+    assert snapshot['version'] > seen + 1
+
+    delta = session.changes_since(seen)
+    assert names(delta) == ["alice", "bob"]
+
+    # Expiry is reported once, not on every read
+    assert session.snapshot()['version'] == snapshot['version']
+
+
+def test_wait_for_change_wakes_on_expiry(monkeypatch):
+    monkeypatch.setattr(live_session_module, "PRESENCE_TIMEOUT", 0.05)
+    session = LiveSession("s1")
+    assert session.wait_for_change(session.version, 0.01) is False
+
+    session.update([observation("alice")])
+    seen = session.version
+    assert session.wait_for_change(seen, 1.0) is True
+    assert session.snapshot()['students'][0]['status'] == "Absent"
+
+
+def test_stream_starts_with_snapshot():
+    session = LiveSession("s1")
+    session.update([observation("alice")])
+    events = stream_events(session, interval=0)
+    try:
+        event = next(events)
+    finally:
+        events.close()
+    header, data = event.strip().split("\n")
+    assert header == "event: snapshot"
+    assert names(json.loads(data[len("data: "):])) == ["alice"]
@@ -0,0 +1,103 @@
+import math
+
+import numpy as np
+import pytest
+
+pytest.importorskip("mediapipe")
+pytest.importorskip("cv2")
+
+from posture_detector import calculate_angle, score_postures, upper_body_rois
+
+
+def scalar_angle(a, b, c):
+    """Reference angle at b, computed one triple at a time"""
+    ba = np.subtract(a, b)
+    bc = np.subtract(c, b)
+    norm_ba, norm_bc = np.linalg.norm(ba), np.linalg.norm(bc)
+    if norm_ba == 0 or norm_bc == 0:
+        return 0
+    cosine = np.clip(np.dot(ba, bc) / (norm_ba * norm_bc), -1.0, 1.0)
+    return math.degrees(math.acos(cosine))
+
+
+def rotate(vector, degrees):
+    theta = math.radians(degrees)
+    x, y = vector
+    return (x * math.cos(theta) - y * math.sin(theta), x * math.sin(theta) + y * math.cos(theta))
+
+
+def keypoints(neck_angle, left_bend, right_bend):
+    """Build (5, 2) keypoints with the given neck and bend angles"""
+    nose = (0.0, 0.0)
+    half = math.radians(neck_angle / 2)
+    left_shoulder = (-math.sin(half), math.cos(half))
+    right_shoulder = (math.sin(half), math.cos(half))
+    to_nose_left = (nose[0] - left_shoulder[0], nose[1] - left_shoulder[1])
+    to_nose_right = (nose[0] - right_shoulder[0], nose[1] - right_shoulder[1])
+    left_ear = np.add(left_shoulder, rotate(to_nose_left, left_bend))
+    right_ear = np.add(right_shoulder, rotate(to_nose_right, -right_bend))
+    return np.array([left_shoulder, right_shoulder, left_ear, right_ear, nose])
+
+
+def test_vectorized_angles_match_scalar_path():
+    rng = np.random.default_rng(0)
+    a, b, c = rng.random((3, 50, 2))
+    angles = calculate_angle(a, b, c)
+    assert angles.shape == (50,)
+    expected = [scalar_angle(a[i], b[i], c[i]) for i in range(50)]
+    assert np.allclose(angles, expected)
+    assert calculate_angle(a[0], b[0], c[0]) == pytest.approx(expected[0])
+    assert isinstance(calculate_angle(a[0], b[0], c[0]), float)
+
+
+def test_zero_length_vector_gives_zero():
+    assert calculate_angle([1, 1], [1, 1], [2, 3]) == 0
+    angles = calculate_angle([[1, 1], [0, 1]], [[1, 1], [0, 0]], [[2, 3], [1, 0]])
+    assert angles[0] == 0
+    assert angles[1] == pytest.approx(90)
+
+
+def test_keypoint_builder_produces_requested_angles():
+    good, neck, left, right, _ = score_postures(keypoints(70, 20, 30)[np.newaxis])
+    assert neck[0] == pytest.approx(70)
+    assert left[0] == pytest.approx(20)
+    assert right[0] == pytest.approx(30)
+
+
+@pytest.mark.parametrize("neck, left, right, is_good", [
+    (70, 20, 20, True),
+    (51, 39, 39, True),
+    (89, 10, 10, True),
+    (49, 20, 20, False),
+    (91, 20, 20, False),
+    (70, 41, 20, False),
+    (70, 20, 41, False),
+])
+def test_good_posture_cutoffs(neck, left, right, is_good):
+    good, _, _, _, score = score_postures(keypoints(neck, left, right)[np.newaxis])
+    assert bool(good[0]) is is_good
+    if is_good:
+        assert score[0] == 100
+
+
+def test_bad_posture_score_and_minimum():
+    batch = np.stack([keypoints(120, 20, 20), keypoints(170, 80, 80)])
+    good, _, _, _, score = score_postures(batch)
+    assert not good.any()
+    # 100 minus the deviation from 70 / 20 / 20 degrees
+    assert score[0] == pytest.approx(50)
+    # Large deviations bottom out at 20
+    assert score[1] == 20
+
+
+def test_rois_cover_upper_body_around_face():
+    # (top, right, bottom, left) face of 50x50 pixels in the middle of the frame
+    assert upper_body_rois([(100, 150, 150, 100)], (1000, 1000, 3)) == [(25, 75, 225, 275)]
+
+
+def test_rois_are_clipped_to_frame():
+    rois = upper_body_rois([(10, 60, 60, 10), (50, 95, 95, 50)], (100, 120, 3))
+    assert rois[0] == (0, 0, 120, 100)
+    for x0, y0, x1, y1 in rois:
+        assert 0 <= x0 < x1 <= 120
+        assert 0 <= y0 < y1 <= 100
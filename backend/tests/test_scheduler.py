@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+
+from scheduler import FrameScheduler, SUPERSEDED, DEADLINE, OVERLOADED
+
+
+def occupy_worker(scheduler, stream_id="busy"):
+    """Keep the scheduler's only worker busy until the returned event is set"""
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+        return "busy-done"
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(scheduler.run(stream_id, blocking, 10)))
+    thread.start()
+    assert started.wait(5)
+    return release, thread, results
+
+
+def run_in_thread(scheduler, stream_id, func, deadline=None):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(scheduler.run(stream_id, func, deadline)))
+    thread.start()
+    return thread, results
+
+
+def wait_pending(scheduler, count):
+    for _ in range(500):
+        with scheduler._cond:
+            if len(scheduler._pending) == count:
+                return
+        threading.Event().wait(0.01)
+    raise AssertionError(f"expected {count} pending streams")
+
+
+def test_runs_func_and_returns_result():
+    scheduler = FrameScheduler()
+    assert scheduler.run("a", lambda: 42) == (42, None)
+
+
+def test_newer_frame_supersedes_pending_one():
+    scheduler = FrameScheduler()
+    release, busy, _ = occupy_worker(scheduler)
+
+    old_thread, old = run_in_thread(scheduler, "a", lambda: "old")
+    wait_pending(scheduler, 1)
+    new_thread, new = run_in_thread(scheduler, "a", lambda: "new")
+    old_thread.join(5)
+    assert old == [(None, SUPERSEDED)]
+
+    release.set()
+    new_thread.join(5)
+    busy.join(5)
+    assert new == [("new", None)]
+
+
+def test_frame_waiting_past_deadline_is_dropped():
+    scheduler = FrameScheduler()
+    release, busy, _ = occupy_worker(scheduler)
+    called = []
+    try:
+        assert scheduler.run("a", lambda: called.append(1), deadline=0.05) == (None, DEADLINE)
+    finally:
+        release.set()
+        busy.join(5)
+    assert not called
+    assert not scheduler._pending
+
+
+def test_new_stream_rejected_when_too_many_are_waiting():
+    scheduler = FrameScheduler(max_pending_streams=1)
+    release, busy, _ = occupy_worker(scheduler)
+
+    waiting_thread, waiting = run_in_thread(scheduler, "a", lambda: "a")
+    wait_pending(scheduler, 1)
+    assert scheduler.run("b", lambda: "b") == (None, OVERLOADED)
+
+    release.set()
+    waiting_thread.join(5)
+    busy.join(5)
+    assert waiting == [("a", None)]
+
+
+def test_errors_are_reraised_in_caller():
+    scheduler = FrameScheduler()
+
+    def fail():
+        raise ValueError("bad frame")
+
+    with pytest.raises(ValueError, match="bad frame"):
+        scheduler.run("a", fail)
+    # The worker survives the error
+    assert scheduler.run("a", lambda: "ok") == ("ok", None)
@@ -99,6 +99,10 @@ const CameraFeed: React.FC<CameraFeedProps> = ({
         const result = await processFrame(frame);
         console.log("Processed frame result:", result);
         
+        // The backend dropped this frame in favour of a newer one, or it was too
+        // dark/blurred to analyze; keep the last state
+        if (result.skipped || result.frame_quality === 'low') return;
+        
         setActivityStatus(result.activity_status || "Active");
         
         if (result.faces && result.faces.length > 0) {
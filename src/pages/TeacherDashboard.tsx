@@ -1,25 +1,14 @@
 
-import React, { useState } from "react";
+import React, { useEffect, useState } from "react";
 import { Card } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
 import { Download, Users, AlertTriangle, CheckCircle, Activity, RefreshCw } from "lucide-react";
 import { useToast } from "@/hooks/use-toast";
-import { useQuery, useMutation, useQueryClient } from "@tanstack/react-query";
-import { getAttendance, downloadAttendance, resetSession, getCurrentSession } from "@/services/api";
-
-interface AttendanceRecord {
-  date: string;
-  session: string;
-  name: string;
-  status: string;
-  engagement: number;
-  remarks: string;
-  posture: string;
-}
+import { useQuery, useMutation } from "@tanstack/react-query";
+import { downloadAttendance, resetSession, getCurrentSession, subscribeLiveSession, LiveStudent } from "@/services/api";
 
 const TeacherDashboard = () => {
   const { toast } = useToast();
-  const queryClient = useQueryClient();
   const [currentSessionId, setCurrentSessionId] = useState<string>("");
 
   // Get current session on load
@@ -33,19 +22,41 @@ const TeacherDashboard = () => {
     }
   });
 
-  // Get attendance data for the current session
-  const { data: attendanceData, isLoading } = useQuery({
-    queryKey: ['attendance', currentSessionId],
-    queryFn: () => getAttendance(currentSessionId),
-    refetchInterval: 10000, // Refresh every 10 seconds
-  });
+  // Live state of every student, pushed by the backend as frames are processed
+  const [students, setStudents] = useState<Record<string, LiveStudent>>({});
+  const [isLoading, setIsLoading] = useState(true);
+  const [isDisconnected, setIsDisconnected] = useState(false);
+
+  useEffect(() => {
+    return subscribeLiveSession(
+      (sessionId, snapshot) => {
+        setCurrentSessionId(sessionId);
+        setStudents(Object.fromEntries(snapshot.map((student) => [student.name, student])));
+        setIsLoading(false);
+        setIsDisconnected(false);
+      },
+      (changed) => {
+        setStudents((previous) => ({
+          ...previous,
+          ...Object.fromEntries(changed.map((student) => [student.name, student])),
+        }));
+      },
+      () => {
+        // Stop the loading screen; the stream keeps retrying and the next
+        // snapshot clears the warning
+        setIsLoading(false);
+        setIsDisconnected(true);
+      },
+    );
+  }, []);
+
+  const attendanceData = Object.values(students).sort((a, b) => a.name.localeCompare(b.name));
 
   // Mutation for resetting the session
   const resetSessionMutation = useMutation({
     mutationFn: resetSession,
     onSuccess: (newSessionId) => {
       setCurrentSessionId(newSessionId);
-      queryClient.invalidateQueries({ queryKey: ['attendance'] });
       toast({
         title: "New Session Started",
         description: "Previous attendance records have been archived and a new session has begun.",
@@ -125,6 +136,13 @@ const TeacherDashboard = () => {
           </div>
         </div>
         
+        {isDisconnected && (
+          <div className="flex items-center gap-2 p-4 border-2 rounded-lg bg-red-100 border-red-500 text-red-700">
+            <AlertTriangle className="w-5 h-5" />
+            <p className="text-sm">Cannot reach the live session stream. Retrying...</p>
+          </div>
+        )}
+
         <Card className="p-6 bg-white/80 backdrop-blur-sm shadow-xl">
           <div className="flex items-center justify-between mb-6 flex-wrap gap-2">
             <div className="flex items-center gap-2">
@@ -137,15 +155,15 @@ const TeacherDashboard = () => {
           </div>
           
           <div className="space-y-4">
-            {attendanceData?.map((record: AttendanceRecord, index: number) => (
+            {attendanceData.map((record: LiveStudent) => (
               <div
-                key={index}
+                key={record.name}
                 className={`p-4 border-2 rounded-lg ${getEngagementColor(record.engagement)} transition-all hover:scale-[1.01]`}
               >
                 <div className="flex items-center justify-between">
                   <div>
                     <h3 className="text-lg font-medium">{record.name}</h3>
-                    <p className="text-sm opacity-75">Date: {record.date}</p>
+                    <p className="text-sm opacity-75">{record.status} · Date: {record.date}</p>
                   </div>
                   <div className="flex items-center gap-4">
                     <div className="text-right">
@@ -176,7 +194,7 @@ const TeacherDashboard = () => {
               </div>
             ))}
 
-            {(!attendanceData || attendanceData.length === 0) && (
+            {attendanceData.length === 0 && (
               <div className="text-center py-8 text-gray-500">
                 No attendance records found for the current session
               </div>
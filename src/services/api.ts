@@ -1,6 +1,25 @@
 
+interface PersonPosture {
+  posture_status: string;
+  neck_angle: number;
+  left_bend: number;
+  right_bend: number;
+  posture_score: number;
+  activity_status: string;
+}
+
+interface FaceEngagement {
+  engagement: number;
+  remarks: string;
+  gaze_status: string;
+}
+
 interface ProcessFrameResponse {
   faces: string[];
+  face_locations?: [number, number, number, number][];
+  small_faces?: number;
+  engagements?: FaceEngagement[];
+  postures?: PersonPosture[];
   engagement: number;
   remarks: string;
   gaze_status: string;
@@ -10,9 +29,18 @@ interface ProcessFrameResponse {
   right_bend: number;
   posture_score: number;
   activity_status: string;
+  skipped?: boolean;
+  reason?: string;
+  frame_quality?: 'ok' | 'low';
   error?: string;
 }
 
+// Identifies this tab to the backend scheduler, which only keeps the
+// newest pending frame per client
+const clientId = typeof crypto !== 'undefined' && 'randomUUID' in crypto
+  ? crypto.randomUUID()
+  : Math.random().toString(36).slice(2);
+
 export async function processFrame(frame: string): Promise<ProcessFrameResponse> {
   try {
     console.log("Sending frame to backend for processing");
@@ -21,7 +49,7 @@ export async function processFrame(frame: string): Promise<ProcessFrameResponse>
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({ frame }),
+      body: JSON.stringify({ frame, client_id: clientId }),
     });
 
     if (!response.ok) {
@@ -71,6 +99,65 @@ export async function getAttendance(sessionId?: string) {
   }
 }
 
+export interface LiveStudent {
+  date: string;
+  session: string;
+  name: string;
+  status: string;
+  engagement: number;
+  remarks: string;
+  gaze_status?: string;
+  posture: string;
+  posture_score?: number;
+  last_seen: number;
+}
+
+interface LiveSessionUpdate {
+  session_id: string;
+  version: number;
+  reset?: boolean;
+  students: LiveStudent[];
+}
+
+// Subscribes to live class state pushed by the backend. onSnapshot receives the
+// full state (on connect and after a session reset), onDelta only changed students,
+// onError is called whenever the connection fails or drops.
+// Returns a function that closes the connection.
+export function subscribeLiveSession(
+  onSnapshot: (sessionId: string, students: LiveStudent[]) => void,
+  onDelta: (students: LiveStudent[]) => void,
+  onError?: () => void,
+  interval?: number,
+) {
+  const url = interval
+    ? `http://localhost:5000/api/live-session/stream?interval=${interval}`
+    : 'http://localhost:5000/api/live-session/stream';
+  console.log("Subscribing to live session updates");
+  const source = new EventSource(url);
+
+  source.addEventListener('snapshot', (event) => {
+    const update: LiveSessionUpdate = JSON.parse((event as MessageEvent).data);
+    onSnapshot(update.session_id, update.students);
+  });
+
+  source.addEventListener('delta', (event) => {
+    const update: LiveSessionUpdate = JSON.parse((event as MessageEvent).data);
+    if (update.reset) {
+      onSnapshot(update.session_id, update.students);
+    } else {
+      onDelta(update.students);
+    }
+  });
+
+  source.onerror = (error) => {
+    // EventSource reconnects on its own and receives a fresh snapshot
+    console.error('Live session stream error:', error);
+    onError?.();
+  };
+
+  return () => source.close();
+}
+
 export async function downloadAttendance() {
   try {
     console.log("Requesting attendance download from backend");